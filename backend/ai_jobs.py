@@ -0,0 +1,217 @@
+"""Background queue for AI requests, persisted in the ``ai_jobs`` collection.
+
+``submit`` stores a job and returns its id straight away. A fixed pool of
+in-app workers claims queued jobs with ``find_one_and_update``, so several
+uvicorn workers can share one queue. Each claim takes a lease; jobs left
+``running`` after a crash are requeued once their lease expires, both on
+startup and by a periodic sweep. A handler is cut off at ``job_timeout``,
+which must be shorter than the lease so a live job is never requeued under
+the worker still running it.
+
+A handler error that ``retry_delay`` recognises as transient (the gate's 429,
+an open breaker's 503, a 504) puts the job back in the queue with a
+``run_after`` backoff instead of failing it, until ``max_attempts`` is spent.
+"""
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[dict]]
+# Seconds to wait before retrying after this error, or None if it is not transient
+RetryDelay = Callable[[Exception], Optional[float]]
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db,
+        handlers: Dict[str, Handler],
+        workers: int = 4,
+        lease_seconds: int = 120,
+        job_timeout: float = 90.0,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        retry_delay: Optional[RetryDelay] = None,
+        max_backoff: float = 60.0,
+    ):
+        if job_timeout >= lease_seconds:
+            raise ValueError("job_timeout must be shorter than lease_seconds")
+        self.db = db
+        self.handlers = handlers
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.job_timeout = job_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.worker_id = str(uuid.uuid4())
+        self.tasks = []
+        self.wakeup = asyncio.Event()
+        self.finished: Dict[str, asyncio.Event] = {}
+        self.watchers: Dict[str, int] = defaultdict(int)
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def submit(self, kind: str, user_id: str, params: dict, payload: Optional[bytes] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind}")
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "user_id": user_id,
+            "status": "queued",
+            "params": params,
+            "payload": payload,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": datetime.now(timezone.utc),
+        }
+        await self.db.ai_jobs.insert_one(job)
+        self.wakeup.set()
+        return job['id']
+
+    async def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        return await self.db.ai_jobs.find_one(
+            {"id": job_id, "user_id": user_id},
+            {"_id": 0, "payload": 0, "params": 0, "worker": 0}
+        )
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        """Sleep until a local worker finishes ``job_id`` or ``timeout`` passes.
+
+        Jobs finished by another process are only seen on the caller's next poll.
+        """
+        event = self.finished.setdefault(job_id, asyncio.Event())
+        self.watchers[job_id] += 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # The last watcher drops the event; a job finished elsewhere never pops it in _finish
+            self.watchers[job_id] -= 1
+            if not self.watchers[job_id]:
+                del self.watchers[job_id]
+                self.finished.pop(job_id, None)
+
+    async def requeue_expired(self) -> int:
+        now = datetime.now(timezone.utc)
+        expired = {"status": "running", "lease_until": {"$lt": now}}
+        gave_up = await self.db.ai_jobs.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "error": "Job did not finish", "finished_at": now},
+             "$unset": {"payload": ""}}
+        )
+        requeued = await self.db.ai_jobs.update_many(
+            expired, {"$set": {"status": "queued"}, "$unset": {"lease_until": ""}}
+        )
+        if gave_up.modified_count or requeued.modified_count:
+            logger.warning(f"AI jobs: requeued {requeued.modified_count}, failed {gave_up.modified_count} with expired leases")
+        return requeued.modified_count
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await self.db.ai_jobs.find_one_and_update(
+            # A missing run_after (never retried) counts as due
+            {"status": "queued", "run_after": {"$not": {"$gt": now}}},
+            {"$set": {
+                "status": "running",
+                "worker": self.worker_id,
+                "started_at": now,
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+            }, "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _finish(self, job: dict, fields: dict):
+        fields["finished_at"] = datetime.now(timezone.utc)
+        # Only the lease holder may finish; a requeued job belongs to someone else now
+        await self.db.ai_jobs.update_one(
+            {"id": job['id'], "worker": self.worker_id, "status": "running"},
+            {"$set": fields, "$unset": {"payload": "", "lease_until": ""}}
+        )
+        event = self.finished.pop(job['id'], None)
+        if event:
+            event.set()
+
+    async def _retry(self, job: dict, delay: float) -> bool:
+        # Same lease-holder guard as _finish; the payload stays for the next attempt
+        backoff = min(max(delay, 2 ** (job['attempts'] - 1)), self.max_backoff)
+        result = await self.db.ai_jobs.update_one(
+            {"id": job['id'], "worker": self.worker_id, "status": "running"},
+            {"$set": {"status": "queued", "run_after": datetime.now(timezone.utc) + timedelta(seconds=backoff)},
+             "$unset": {"worker": "", "lease_until": ""}}
+        )
+        return result.modified_count == 1
+
+    async def _run(self, job: dict):
+        try:
+            result = await asyncio.wait_for(self.handlers[job['kind']](job), self.job_timeout)
+        except Exception as e:
+            delay = self.retry_delay(e) if self.retry_delay else None
+            if delay is not None and job['attempts'] < self.max_attempts:
+                logger.warning(f"AI job {job['id']} hit a transient error ({e!r}), retrying")
+                if await self._retry(job, delay):
+                    self.retried += 1
+                return
+            logger.exception(f"AI job {job['id']} failed")
+            self.failed += 1
+            await self._finish(job, {"status": "failed", "error": str(e) or e.__class__.__name__})
+            return
+        self.completed += 1
+        await self._finish(job, {"status": "done", "result": result})
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("AI job claim failed")
+                job = None
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                await self.requeue_expired()
+            except Exception:
+                logger.exception("AI job sweep failed")
+
+    async def start(self):
+        await self.requeue_expired()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": len(self.tasks) > 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
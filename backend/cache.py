@@ -0,0 +1,374 @@
+"""Read-through cache for hot per-user reads (the wallet balance) and the helper list.
+
+``ReadThroughCache.get_or_load`` checks a bounded in-process LRU, then an
+optional shared tier, and only then calls the loader. Concurrent misses on one
+key share a single load (the stampede guard), so a cold key costs one database
+read however many requests arrive together. Values are stored in their JSON
+form, which is exactly what the route would have returned.
+
+The shared tier speaks the Redis protocol (``RedisCache``, a minimal RESP
+client with no extra dependency). With it, an invalidation in one worker drops
+the shared key for all of them. ``invalidate`` only ever reaches the local LRU
+of the worker that wrote, so every other worker's copy stays stale until it
+expires: local entries are therefore capped at ``local_ttl``, with or without
+a shared tier, and the full ``ttl`` applies only to the shared copy. Values
+that must never lag a write in another worker, like a balance, are read with
+``local=False`` and live in the shared tier alone. A shared-tier error is
+logged and treated as a miss; it never fails the request.
+
+Writers call ``invalidate`` with the keys they changed, after the write. A load
+that is still in flight when its key is invalidated returns its value to the
+callers already waiting on it but does not store it, and later callers start
+a fresh load rather than joining it.
+
+Run this module directly to exercise both tiers against an in-process fake
+Redis server.
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlsplit
+
+from fastapi.encoders import jsonable_encoder
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+
+def profile_key(user_id: str) -> str:
+    return f"profile:{user_id}"
+
+
+def wallet_key(user_id: str) -> str:
+    return f"wallet:{user_id}"
+
+
+HELPERS_KEY = "helpers"
+
+
+def versioned_key(key: str, version: int) -> str:
+    """``key`` at one resource version (see versions.py); a bump makes older entries unreachable."""
+    return f"{key}:v{version}"
+
+
+def user_keys(*user_ids: str) -> list:
+    """Every cached key derived from these users' documents."""
+    return [key for user_id in user_ids for key in (profile_key(user_id), wallet_key(user_id))]
+
+
+class LocalCache:
+    """Bounded LRU whose entries also expire after their own TTL."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Return (found, value)."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache:
+    """GET / SET PX / DEL over one RESP connection, reconnecting after any error."""
+
+    def __init__(self, url: str, timeout: float = 0.5, prefix: str = "doerly:"):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.database = int(parts.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.prefix = prefix
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+        self.errors = 0
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._command("AUTH", self.password)
+        if self.database:
+            await self._command("SELECT", str(self.database))
+
+    async def _command(self, *args):
+        encoded = [arg if isinstance(arg, bytes) else str(arg).encode('utf-8') for arg in args]
+        self.writer.write(b"".join(
+            [b"*%d\r\n" % len(encoded)] + [b"$%d\r\n%s\r\n" % (len(arg), arg) for arg in encoded]
+        ))
+        await self.writer.drain()
+        return await self._reply()
+
+    async def _reply(self):
+        line = await self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body
+        if kind == b"-":
+            raise RedisError(body.decode('utf-8', 'replace'))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [await self._reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    async def execute(self, *args):
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._command(*args), self.timeout)
+            except BaseException:
+                # A reply we stopped reading would desynchronize the next command
+                await self.close()
+                raise
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute("GET", self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.execute("SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        await self.execute("DEL", *(self.prefix + key for key in keys))
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+def _new_counters() -> dict:
+    return {"local_hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+
+class ReadThroughCache:
+    def __init__(self, maxsize: int = 10000, shared: Optional[RedisCache] = None, local_ttl: float = 2.0, enabled: bool = True):
+        self.local = LocalCache(maxsize)
+        self.shared = shared
+        self.local_ttl = local_ttl
+        self.enabled = enabled
+        self.loading: Dict[str, asyncio.Task] = {}
+        self.stale: Set[asyncio.Task] = set()  # loads whose key was invalidated mid-flight
+        self.counters: Dict[str, dict] = defaultdict(_new_counters)  # per key namespace
+
+    async def get_or_load(self, key: str, ttl: float, load: Callable[[], Awaitable[Any]], local: bool = True):
+        """Cached value of ``key``, else ``await load()``; a ``None`` result is not cached.
+
+        With ``local=False`` the in-process LRU is skipped: only the shared tier, if any, caches
+        the value, and concurrent misses still share one load.
+        """
+        if not self.enabled:
+            return await load()
+        counters = self.counters[key.split(':', 1)[0]]
+        if local:
+            found, value = self.local.get(key)
+            if found:
+                counters["local_hits"] += 1
+                return value
+        task = self.loading.get(key)
+        if task is not None:
+            counters["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._fill(key, ttl, load, counters, local))
+            self.loading[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # shield: one caller disconnecting must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, ttl: float, load, counters: dict, local: bool = True):
+        this = asyncio.current_task()
+        local_ttl = min(ttl, self.local_ttl) if local else 0
+        if self.shared:
+            try:
+                raw = await self.shared.get(key)
+            except Exception as e:
+                self._shared_failed("get", e)
+                raw = None
+            if raw is not None:
+                counters["shared_hits"] += 1
+                value = json.loads(raw)
+                if local_ttl and this not in self.stale:
+                    self.local.set(key, value, local_ttl)
+                return value
+        counters["misses"] += 1
+        value = await load()
+        if value is None:
+            return None
+        value = jsonable_encoder(value)
+        if this in self.stale:
+            return value
+        if local_ttl:
+            self.local.set(key, value, local_ttl)
+        if self.shared:
+            try:
+                await self.shared.set(key, fastjson.dumps(value), ttl)
+            except Exception as e:
+                self._shared_failed("set", e)
+        return value
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.loading.get(key) is task:
+            del self.loading[key]
+        self.stale.discard(task)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def _shared_failed(self, operation: str, error: Exception):
+        self.shared.errors += 1
+        logger.warning(f"Shared cache {operation} failed: {error!r}")
+
+    async def invalidate(self, *keys: str):
+        for key in keys:
+            self.local.delete(key)
+            namespace = key.split(':', 1)[0]
+            if namespace in self.counters:  # skip keys this cache never serves
+                self.counters[namespace]["invalidations"] += 1
+            task = self.loading.pop(key, None)
+            if task is not None:
+                self.stale.add(task)
+        if self.shared and keys:
+            try:
+                await self.shared.delete(*keys)
+            except Exception as e:
+                self._shared_failed("delete", e)
+
+    async def close(self):
+        if self.shared:
+            await self.shared.close()
+
+    def stats(self) -> dict:
+        namespaces = {}
+        for namespace, counters in self.counters.items():
+            hits = counters["local_hits"] + counters["shared_hits"] + counters["coalesced"]
+            lookups = hits + counters["misses"]
+            namespaces[namespace] = {**counters, "hit_rate": hits / lookups if lookups else 0.0}
+        return {
+            "enabled": self.enabled,
+            "size": len(self.local.entries),
+            "evictions": self.local.evictions,
+            "loading": len(self.loading),
+            "shared": self.shared is not None,
+            "shared_errors": self.shared.errors if self.shared else 0,
+            "namespaces": namespaces,
+        }
+
+
+async def _fake_redis(store: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve GET/SET/DEL/PING from ``store``; enough RESP for ``RedisCache``."""
+    try:
+        while True:
+            header = await reader.readline()
+            if not header:
+                break
+            args = []
+            for _ in range(int(header[1:-2])):
+                length = int((await reader.readline())[1:-2])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            command = args[0].upper()
+            if command == b"GET":
+                value = store.get(args[1])
+                writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"SET":
+                store[args[1]] = args[2]
+                writer.write(b"+OK\r\n")
+            elif command == b"DEL":
+                removed = sum(store.pop(key, None) is not None for key in args[1:])
+                writer.write(b":%d\r\n" % removed)
+            elif command == b"PING":
+                writer.write(b"+PONG\r\n")
+            else:
+                writer.write(b"-ERR unknown command\r\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _bench(concurrency: int = 200) -> int:
+    """Check the stampede guard, both tiers and invalidation against a fake Redis server."""
+    store = {}
+    server = await asyncio.start_server(lambda r, w: _fake_redis(store, r, w), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.05)  # a slow database read
+        return {"balance": 42.0}
+
+    first = ReadThroughCache(shared=RedisCache(f"redis://127.0.0.1:{port}/0"))
+    second = ReadThroughCache(shared=RedisCache(f"redis://127.0.0.1:{port}/0"))  # another worker
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(first.get_or_load(wallet_key("u1"), 30, load) for _ in range(concurrency)))
+        print(f"{concurrency} concurrent misses: {loads} load(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        assert loads == 1 and all(result == {"balance": 42.0} for result in results)
+
+        await second.get_or_load(wallet_key("u1"), 30, load)
+        print(f"second worker served from shared tier: {loads == 1}")
+        assert loads == 1
+
+        await first.invalidate(wallet_key("u1"))
+        second.local.delete(wallet_key("u1"))  # its local entry expiring after local_ttl
+        await second.get_or_load(wallet_key("u1"), 30, load)
+        print(f"after invalidation: {loads} loads")
+        assert loads == 2
+
+        runs = 10_000
+        started = time.perf_counter()
+        for _ in range(runs):
+            await first.get_or_load(wallet_key("u1"), 30, load)
+        print(f"local hit: {(time.perf_counter() - started) / runs * 1e6:.2f} us")
+        print(first.stats())
+    finally:
+        await first.close()
+        await second.close()
+        await asyncio.sleep(0.01)  # let the fake server see both connections close
+        server.close()
+        await server.wait_closed()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_bench()))
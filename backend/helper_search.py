@@ -0,0 +1,184 @@
+"""Server-side helper search over the ``users`` collection.
+
+Helpers carry lowercase ``name_lower`` and ``skills`` fields. Every query
+starts with an equality on ``user_type``, so each search shape below is served
+by an index in indexes.py whose first key is ``user_type``:
+
+- ``mode=prefix`` anchors a regex on ``name_lower`` or ``skills``.
+- ``mode=text`` uses the ``full_name``/``skills`` text index.
+- Filters alone walk the (user_type, sort key, id) index in order.
+
+Pages are keyset-paginated over (sort key, id), so page N costs the same as
+page 1. Run this module directly to benchmark against a seeded collection.
+"""
+import base64
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+SORT_FIELDS = {"rating": "rating", "recent": "last_active_at"}
+PUBLIC_FIELDS = {
+    "_id": 0, "id": 1, "full_name": 1, "email": 1, "user_type": 1, "skills": 1,
+    "rating": 1, "kyc_status": 1, "last_active_at": 1, "created_at": 1,
+}
+
+
+def normalize_skills(skills: List[str]) -> List[str]:
+    return sorted({skill.strip().lower() for skill in skills if skill.strip()})
+
+
+def search_fields(full_name: str, skills: List[str]) -> dict:
+    """Denormalized fields a helper document needs to be searchable."""
+    return {"name_lower": full_name.lower(), "skills": normalize_skills(skills)}
+
+
+def _encode_cursor(value, doc_id: str) -> str:
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps([value, doc_id]).encode('utf-8')).decode('utf-8')
+
+
+def _decode_cursor(cursor: str) -> Tuple[object, str]:
+    """Raise ValueError for a cursor this module did not produce."""
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if isinstance(value, dict):
+        value = datetime.fromisoformat(value["$date"])
+    return value, doc_id
+
+
+def build_query(
+    q: Optional[str] = None,
+    mode: str = "prefix",
+    skill: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    kyc_status: Optional[str] = None,
+) -> dict:
+    clauses = [{"user_type": "helper"}]
+    if q:
+        if mode == "text":
+            clauses.append({"$text": {"$search": q}})
+        else:
+            prefix = {"$regex": f"^{re.escape(q.strip().lower())}"}
+            clauses.append({"$or": [{"name_lower": prefix}, {"skills": prefix}]})
+    if skill:
+        clauses.append({"skills": skill.strip().lower()})
+    if min_rating is not None:
+        clauses.append({"rating": {"$gte": min_rating}})
+    if kyc_status:
+        clauses.append({"kyc_status": kyc_status})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+async def search(db, query: dict, sort: str = "rating", limit: int = 20, after: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """One page of helpers matching ``query``, best first; returns (helpers, next cursor)."""
+    field = SORT_FIELDS[sort]
+    if after:
+        value, doc_id = _decode_cursor(after)
+        query = {"$and": [query, {"$or": [
+            {field: {"$lt": value}},
+            {field: value, "id": {"$lt": doc_id}},
+        ]}]}
+    docs = await db.users.find(query, PUBLIC_FIELDS).sort(
+        [(field, -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, _encode_cursor(docs[-1].get(field), docs[-1]['id'])
+
+
+async def backfill(db, batch_size: int = 1000) -> int:
+    """Add search fields to helpers registered before search existed."""
+    updated = 0
+    batch = []
+    # Missing fields index as null, so this walks user_type_name_lower rather than scanning
+    async for user in db.users.find(
+        {"user_type": "helper", "name_lower": None},
+        {"_id": 0, "id": 1, "full_name": 1, "skills": 1, "rating": 1, "last_active_at": 1, "created_at": 1}
+    ):
+        fields = search_fields(user.get('full_name', ''), user.get('skills') or [])
+        if user.get('rating') is None:
+            fields['rating'] = 0.0
+        if user.get('last_active_at') is None:
+            created_at = user.get('created_at')
+            fields['last_active_at'] = (
+                datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+            ) or datetime.now(timezone.utc)
+        batch.append(UpdateOne({"id": user['id']}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            await db.users.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.users.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def _bench(users: int = 1_000_000, batch_size: int = 10_000, runs: int = 20) -> int:
+    """Seed ``users`` users (half helpers) into a scratch database and time typical searches."""
+    import random
+    import uuid
+
+    from indexes import INDEXES
+    from ops import connect
+
+    first_names = ["Asha", "Ben", "Chen", "Dana", "Eli", "Fatima", "Gus", "Hana", "Ivan", "Jo", "Kofi", "Lena"]
+    last_names = ["Shah", "Okafor", "Smith", "Garcia", "Kim", "Novak", "Ali", "Brown", "Silva", "Ito"]
+    all_skills = ["plumbing", "cleaning", "moving", "tutoring", "gardening", "painting", "cooking", "delivery", "tax filing", "pet care"]
+
+    async with connect('helper_search_bench', scratch=True) as db:
+        await db.users.create_indexes(INDEXES["users"])
+        now = time.time()
+        started = time.perf_counter()
+        for offset in range(0, users, batch_size):
+            docs = []
+            for _ in range(min(batch_size, users - offset)):
+                full_name = f"{random.choice(first_names)} {random.choice(last_names)}"
+                helper = random.random() < 0.5
+                doc = {
+                    "id": str(uuid.uuid4()),
+                    "email": f"{uuid.uuid4().hex}@bench.local",
+                    "full_name": full_name,
+                    "user_type": "helper" if helper else "user",
+                    "kyc_status": random.choice(["pending", "verified"]),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }
+                if helper:
+                    doc.update(search_fields(full_name, random.sample(all_skills, 3)))
+                    doc["rating"] = round(random.uniform(1, 5), 2)
+                    doc["last_active_at"] = datetime.fromtimestamp(now - random.uniform(0, 90 * 86400), timezone.utc)
+                docs.append(doc)
+            await db.users.insert_many(docs, ordered=False)
+        print(f"Seeded {users} users in {time.perf_counter() - started:.1f}s")
+
+        cases = {
+            "filters only, by rating": (build_query(min_rating=4.0), "rating"),
+            "prefix 'as', by rating": (build_query("as"), "rating"),
+            "prefix 'plumb' + verified": (build_query("plumb", kyc_status="verified"), "rating"),
+            "text 'garcia tutoring'": (build_query("garcia tutoring", mode="text"), "rating"),
+            "skill filter, by recent": (build_query(skill="pet care"), "recent"),
+        }
+        for name, (query, sort) in cases.items():
+            timings = []
+            cursor = None
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                _, cursor = await search(db, query, sort, 20, cursor)
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            print(f"{name}: p50 {timings[len(timings) // 2]:.1f} ms, p95 {timings[int(0.95 * len(timings))]:.1f} ms over {runs} pages")
+    return 0
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)))
@@ -0,0 +1,170 @@
+"""Index registry for every collection queried by server.py.
+
+Indexes are declared once here and created on startup by ``ensure_indexes``.
+``ROUTE_QUERIES`` mirrors the filter/sort shape each route sends to MongoDB so
+``find_collection_scans`` can ``explain()`` them and flag any COLLSCAN plan.
+"""
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+AI_JOB_TTL_SECONDS = 24 * 3600
+READ_NOTIFICATION_TTL_SECONDS = 30 * 24 * 3600
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_type", ASCENDING), ("created_at", DESCENDING)], name="user_type_created_at"),
+        # Helper search: one index per sort order and per prefix field, plus the text index
+        IndexModel([("user_type", ASCENDING), ("rating", DESCENDING), ("id", DESCENDING)], name="user_type_rating"),
+        IndexModel([("user_type", ASCENDING), ("last_active_at", DESCENDING), ("id", DESCENDING)], name="user_type_last_active_at"),
+        IndexModel([("user_type", ASCENDING), ("name_lower", ASCENDING)], name="user_type_name_lower"),
+        IndexModel([("user_type", ASCENDING), ("skills", ASCENDING)], name="user_type_skills"),
+        IndexModel([("user_type", ASCENDING), ("full_name", TEXT), ("skills", TEXT)], name="user_type_text"),
+    ],
+    "tasks": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_by", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="created_by_created_at"),
+    ],
+    "transactions": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("from_user", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="from_user_created_at"),
+    ],
+    "automations": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at"),
+        IndexModel([("active", ASCENDING), ("next_run_at", ASCENDING)], name="active_next_run_at"),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at"),
+        # Only read notifications carry read_at, so unread ones never expire
+        IndexModel([("read_at", ASCENDING)], expireAfterSeconds=READ_NOTIFICATION_TTL_SECONDS, name="read_at_ttl"),
+    ],
+    "notification_counters": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+    ],
+    "ledger_entries": [
+        IndexModel([("account", ASCENDING), ("seq", ASCENDING)], unique=True, name="account_seq_unique"),
+    ],
+    "ledger_accounts": [
+        IndexModel([("account", ASCENDING)], unique=True, name="account_unique"),
+    ],
+    "ledger_external": [
+        IndexModel([("account", ASCENDING), ("created_at", ASCENDING), ("txn_id", ASCENDING)], name="account_created_at"),
+    ],
+    "ledger_snapshots": [
+        IndexModel([("account", ASCENDING), ("seq", DESCENDING)], unique=True, name="account_seq"),
+    ],
+    "ai_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=AI_JOB_TTL_SECONDS, name="finished_at_ttl"),
+    ],
+    "llm_cache": [
+        IndexModel([("key", ASCENDING)], unique=True, name="key_unique"),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=LLM_CACHE_TTL_SECONDS, name="created_at_ttl"),
+    ],
+    "user_stats": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+    ],
+    "disputes": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at"),
+    ],
+}
+
+# (route, collection, filter, sort) - one entry per distinct query shape in server.py
+ROUTE_QUERIES: List[Tuple[str, str, dict, Optional[list]]] = [
+    ("register/login/send_money", "users", {"email": "probe@example.com"}, None),
+    ("get_profile/get_wallet/payments", "users", {"id": "probe"}, None),
+    ("get_helpers", "users", {"user_type": "helper"}, None),
+    ("search_helpers", "users", {"user_type": "helper"}, [("rating", DESCENDING), ("id", DESCENDING)]),
+    ("search_helpers recent", "users", {"user_type": "helper"}, [("last_active_at", DESCENDING), ("id", DESCENDING)]),
+    ("search_helpers prefix", "users", {"user_type": "helper", "name_lower": {"$regex": "^probe"}}, None),
+    ("search_helpers skill", "users", {"user_type": "helper", "skills": "probe"}, None),
+    ("get_tasks", "tasks", {"created_by": "probe"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("get_task/update_task_status", "tasks", {"id": "probe"}, None),
+    ("accept_task", "tasks", {"id": "probe", "status": "pending"}, None),
+    ("get_transactions", "transactions", {"from_user": "probe"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("release_payment", "transactions", {"id": "probe"}, None),
+    ("get_automations", "automations", {"user_id": "probe"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("toggle_automation/delete_automation", "automations", {"id": "probe", "user_id": "probe"}, None),
+    ("automation scheduler claim", "automations", {"active": True, "next_run_at": {"$lte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("next_run_at", ASCENDING)]),
+    ("get_notifications", "notifications", {"user_id": "probe"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("mark_read", "notifications", {"id": "probe", "user_id": "probe"}, None),
+    ("mark_many_read", "notifications", {"user_id": "probe", "read": False, "id": {"$in": ["probe"]}}, None),
+    ("get_unread_count", "notification_counters", {"user_id": "probe"}, None),
+    ("get_statement", "ledger_entries", {"account": "probe"}, [("seq", DESCENDING)]),
+    ("get_balance", "ledger_snapshots", {"account": "probe"}, [("seq", DESCENDING)]),
+    ("get_ai_job", "ai_jobs", {"id": "probe", "user_id": "probe"}, None),
+    ("ai job claim", "ai_jobs", {"status": "queued", "run_after": {"$not": {"$gt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}}, [("created_at", ASCENDING)]),
+    ("llm cache lookup", "llm_cache", {"key": "probe"}, None),
+    ("get_user_stats", "user_stats", {"user_id": "probe"}, None),
+    ("get_disputes", "disputes", {"user_id": "probe"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("check_etag", "resource_versions", {"_id": "probe"}, None),
+]
+
+
+async def ensure_indexes(db) -> None:
+    """Create every registered index. Safe to call on each startup."""
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate emails already stored; keep booting, but make it loud
+            logger.error(f"Index creation failed on {collection}: {e}")
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def find_collection_scans(db) -> List[str]:
+    """Return the routes whose winning query plan contains a COLLSCAN stage."""
+    offenders = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        cursor = db[collection].find(query, {"_id": 0})
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        # SBE plans nest the classic plan under "queryPlan"
+        winning_plan = winning_plan.get("queryPlan", winning_plan)
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            offenders.append(f"{route} ({collection} {query})")
+    return offenders
+
+
+async def assert_no_collection_scans(db) -> None:
+    offenders = await find_collection_scans(db)
+    assert not offenders, f"Routes using COLLSCAN: {offenders}"
+
+
+async def _main() -> int:
+    from ops import connect
+
+    async with connect() as db:
+        await ensure_indexes(db)
+        offenders = await find_collection_scans(db)
+    for offender in offenders:
+        print(f"COLLSCAN: {offender}")
+    return 1 if offenders else 0
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,291 @@
+"""Append-only wallet ledger with periodic balance snapshots.
+
+The ledger is double-entry: every balance movement appends one entry per
+account it touches to ``ledger_entries``, and the entries of one ``txn_id``
+sum to zero. Money entering or leaving the app is posted against
+``external:*`` accounts (deposits, withdrawals, opening balances and closed
+accounts), so those accounts carry the other side of every movement. Wallet
+entries are numbered by a per-account ``seq``. ``ledger_accounts`` holds the
+next seq and running balance for each wallet, and ``ledger_snapshots``
+checkpoints (seq, balance). A balance or statement therefore reads the latest
+snapshot plus the tail of entries after it, never the full history.
+
+External legs go to ``ledger_external`` instead, as plain inserts ordered by
+(created_at, txn_id) with no seq or running balance. Every deposit touches an
+external account; a shared counter document there would make all deposits
+(and all withdrawals) conflict with each other inside their transactions.
+``verify`` covers those legs through the per-transaction zero-sum check.
+
+Wallets funded before the ledger existed are opened once with an
+``opening_balance`` entry for the difference (see ``wallet.open_ledger_accounts``).
+A deleted user's account is closed rather than removed, so the history still
+balances.
+
+Run this module directly to open pre-ledger wallets, compact (snapshot) busy
+accounts and verify ``users.wallet_balance`` against a streaming replay of the
+ledger.
+"""
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_PREFIX = "external:"
+EXTERNAL_DEPOSITS = "external:deposits"
+EXTERNAL_WITHDRAWALS = "external:withdrawals"
+EXTERNAL_OPENING = "external:opening_balances"
+EXTERNAL_CLOSURES = "external:closed_accounts"
+SNAPSHOT_EVERY = 1000
+
+
+async def _append(db, account: str, amount: float, txn_id: str, kind: str, counterparty: str, session=None) -> dict:
+    counter = await db.ledger_accounts.find_one_and_update(
+        {"account": account},
+        {"$inc": {"seq": 1, "balance": amount}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    entry = {
+        "account": account,
+        "seq": counter['seq'],
+        "amount": amount,
+        "balance_after": counter['balance'],
+        "txn_id": txn_id,
+        "kind": kind,
+        "counterparty": counterparty,
+        "created_at": datetime.now(timezone.utc),
+    }
+    await db.ledger_entries.insert_one(entry, session=session)
+    entry.pop('_id', None)
+    return entry
+
+
+async def _append_external(db, account: str, amount: float, txn_id: str, kind: str, counterparty: str, session=None):
+    # Insert only: concurrent transactions never write the same document
+    await db.ledger_external.insert_one({
+        "account": account,
+        "amount": amount,
+        "txn_id": txn_id,
+        "kind": kind,
+        "counterparty": counterparty,
+        "created_at": datetime.now(timezone.utc),
+    }, session=session)
+
+
+async def _post(db, from_account: str, to_account: str, amount: float, txn_id: str, kind: str, session=None) -> None:
+    """Both legs of moving ``amount`` from one account to another."""
+    for account, signed, counterparty in ((from_account, -amount, to_account), (to_account, amount, from_account)):
+        append = _append_external if account.startswith(EXTERNAL_PREFIX) else _append
+        await append(db, account, signed, txn_id, kind, counterparty, session=session)
+
+
+async def record_deposit(db, account: str, amount: float, txn_id: str, session=None) -> None:
+    await _post(db, EXTERNAL_DEPOSITS, account, amount, txn_id, "add_funds", session=session)
+
+
+async def record_withdrawal(db, account: str, amount: float, txn_id: str, session=None) -> None:
+    await _post(db, account, EXTERNAL_WITHDRAWALS, amount, txn_id, "withdraw", session=session)
+
+
+async def record_transfer(db, from_account: str, to_account: str, amount: float, txn_id: str, session=None) -> None:
+    await _post(db, from_account, to_account, amount, txn_id, "send_money", session=session)
+
+
+async def record_opening(db, account: str, wallet_balance: float, session=None) -> float:
+    """Post the part of ``wallet_balance`` the ledger has not seen; returns that amount."""
+    counter = await db.ledger_accounts.find_one({"account": account}, {"_id": 0, "balance": 1}, session=session)
+    opening = wallet_balance - (counter['balance'] if counter else 0.0)
+    if opening:
+        await _post(db, EXTERNAL_OPENING, account, opening, f"opening:{account}", "opening_balance", session=session)
+    return opening
+
+
+async def record_closure(db, account: str, balance: float, session=None) -> None:
+    """Pay out ``balance`` and mark the account closed; verify then expects no user for it."""
+    if balance:
+        await _post(db, account, EXTERNAL_CLOSURES, balance, f"close:{account}", "close_account", session=session)
+    await db.ledger_accounts.update_one(
+        {"account": account}, {"$set": {"closed": True}}, upsert=True, session=session
+    )
+
+
+async def _latest_snapshot(db, account: str) -> dict:
+    snapshot = await db.ledger_snapshots.find_one(
+        {"account": account}, {"_id": 0}, sort=[("seq", -1)]
+    )
+    return snapshot or {"account": account, "seq": 0, "balance": 0.0}
+
+
+async def get_balance(db, account: str) -> Tuple[float, int]:
+    """Return (balance, seq) from the latest snapshot plus the entries after it."""
+    snapshot = await _latest_snapshot(db, account)
+    rows = await db.ledger_entries.aggregate([
+        {"$match": {"account": account, "seq": {"$gt": snapshot['seq']}}},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}, "seq": {"$max": "$seq"}}},
+    ]).to_list(1)
+    if not rows or rows[0]['seq'] is None:
+        return snapshot['balance'], snapshot['seq']
+    return snapshot['balance'] + rows[0]['amount'], rows[0]['seq']
+
+
+async def external_balance(db, account: str) -> float:
+    """Net of every leg posted to an external account (offline/reporting use: it scans them all)."""
+    rows = await db.ledger_external.aggregate([
+        {"$match": {"account": account}},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}}},
+    ]).to_list(1)
+    return rows[0]['amount'] if rows else 0.0
+
+
+async def _txn_totals(collection):
+    async for row in collection.aggregate([
+        {"$group": {"_id": "$txn_id", "total": {"$sum": "$amount"}}},
+        {"$sort": {"_id": 1}},
+    ], allowDiskUse=True):
+        yield row['_id'], row['total']
+
+
+async def _unbalanced(db, tolerance: float):
+    """Yield (txn_id, total) for transactions whose wallet and external legs do not cancel out.
+
+    Both collections are grouped by txn_id in sorted order and merge-joined, so
+    memory stays flat.
+    """
+    wallet_legs, external_legs = _txn_totals(db.ledger_entries), _txn_totals(db.ledger_external)
+    left, right = await anext(wallet_legs, None), await anext(external_legs, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and left[0] < right[0]):
+            txn_id, total = left
+            left = await anext(wallet_legs, None)
+        elif left is None or right[0] < left[0]:
+            txn_id, total = right
+            right = await anext(external_legs, None)
+        else:
+            txn_id, total = left[0], left[1] + right[1]
+            left, right = await anext(wallet_legs, None), await anext(external_legs, None)
+        if abs(total) > tolerance:
+            yield txn_id, total
+
+
+async def get_statement(db, account: str, limit: int = 50, before_seq: Optional[int] = None) -> dict:
+    """Newest-first page of entries; pass the returned next_before_seq to continue."""
+    query = {"account": account}
+    if before_seq is not None:
+        query["seq"] = {"$lt": before_seq}
+    entries = await db.ledger_entries.find(query, {"_id": 0}).sort("seq", -1).limit(limit).to_list(limit)
+    return {
+        "account": account,
+        "entries": entries,
+        "next_before_seq": entries[-1]['seq'] if len(entries) == limit else None,
+    }
+
+
+async def compact(db, snapshot_every: int = SNAPSHOT_EVERY, keep_snapshots: int = 3) -> int:
+    """Snapshot every account with at least ``snapshot_every`` entries since its last snapshot."""
+    written = 0
+    async for counter in db.ledger_accounts.find({}, {"_id": 0, "account": 1, "seq": 1}):
+        account = counter['account']
+        snapshot = await _latest_snapshot(db, account)
+        if counter['seq'] - snapshot['seq'] < snapshot_every:
+            continue
+        balance, seq = await get_balance(db, account)
+        await db.ledger_snapshots.insert_one({
+            "account": account,
+            "seq": seq,
+            "balance": balance,
+            "created_at": datetime.now(timezone.utc),
+        })
+        written += 1
+        # Older snapshots are only needed as fallbacks; keep a few
+        stale = await db.ledger_snapshots.find(
+            {"account": account}, {"_id": 1}
+        ).sort("seq", -1).skip(keep_snapshots).to_list(None)
+        if stale:
+            await db.ledger_snapshots.delete_many({"_id": {"$in": [doc['_id'] for doc in stale]}})
+    return written
+
+
+async def verify(db, batch_size: int = 1000, tolerance: float = 0.005) -> List[dict]:
+    """Replay the ledger in (account, seq) order and compare with users.wallet_balance.
+
+    Entries are streamed in batches, so memory stays flat however long the
+    history is. Returns one problem dict per inconsistent account or
+    transaction whose legs do not sum to zero.
+    """
+    problems = []
+    replayed = {}
+    closed = {doc['account'] async for doc in db.ledger_accounts.find({"closed": True}, {"_id": 0, "account": 1})}
+
+    async def check_account(account: str, balance: float):
+        if account.startswith(EXTERNAL_PREFIX):
+            return  # legacy external rows: no wallet behind them; covered by the per-transaction check
+        user = await db.users.find_one({"id": account}, {"_id": 0, "wallet_balance": 1})
+        if user is None and account in closed:
+            if abs(balance) > tolerance:
+                problems.append({"account": account, "problem": "closed account with balance", "ledger_balance": balance})
+        elif user is None:
+            problems.append({"account": account, "problem": "no such user", "ledger_balance": balance})
+        elif abs(user.get('wallet_balance', 0.0) - balance) > tolerance:
+            problems.append({
+                "account": account,
+                "problem": "balance mismatch",
+                "ledger_balance": balance,
+                "wallet_balance": user.get('wallet_balance', 0.0),
+            })
+
+    account, balance, expected_seq = None, 0.0, 1
+    cursor = db.ledger_entries.find({}, {"_id": 0, "account": 1, "seq": 1, "amount": 1}).sort(
+        [("account", 1), ("seq", 1)]
+    ).batch_size(batch_size)
+    async for entry in cursor:
+        if entry['account'] != account:
+            if account is not None:
+                replayed[account] = balance
+                await check_account(account, balance)
+            account, balance, expected_seq = entry['account'], 0.0, 1
+        if entry['seq'] != expected_seq:
+            problems.append({"account": account, "problem": f"seq gap: expected {expected_seq}, found {entry['seq']}"})
+        balance += entry['amount']
+        expected_seq = entry['seq'] + 1
+    if account is not None:
+        replayed[account] = balance
+        await check_account(account, balance)
+
+    # Double entry: the legs of every transaction cancel out
+    async for txn_id, total in _unbalanced(db, tolerance):
+        problems.append({"txn_id": txn_id, "problem": "unbalanced transaction", "total": total})
+
+    # Wallets holding money that the ledger has never seen
+    async for user in db.users.find({"wallet_balance": {"$ne": 0}}, {"_id": 0, "id": 1, "wallet_balance": 1}):
+        if user['id'] not in replayed and abs(user['wallet_balance']) > tolerance:
+            problems.append({
+                "account": user['id'],
+                "problem": "balance without ledger entries",
+                "ledger_balance": 0.0,
+                "wallet_balance": user['wallet_balance'],
+            })
+    return problems
+
+
+async def _main() -> int:
+    from ops import connect
+    from wallet import open_ledger_accounts
+
+    async with connect() as db:
+        opened = await open_ledger_accounts(db)
+        written = await compact(db)
+        problems = await verify(db)
+    print(f"Opened {opened} pre-ledger wallets, wrote {written} snapshots")
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_main()))
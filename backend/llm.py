@@ -0,0 +1,399 @@
+"""Shared plumbing for the AI routes' model calls.
+
+``ResultCache`` is a content-addressed cache of model responses keyed by
+SHA-256 of (provider, model, system prompt, input). It has two tiers: a
+bounded in-process LRU and a MongoDB ``llm_cache`` collection whose TTL index
+(see indexes.py) expires old entries.
+
+``ModelGate`` caps concurrent upstream calls per model behind a bounded wait
+queue, and ``InFlight`` lets identical concurrent requests share one call.
+
+``ClientPool`` keeps configured chat clients per (provider, model, system
+prompt) so calls reuse them, and their connections, instead of building a
+client per request.
+
+``CircuitBreaker`` and ``LatencyTracker`` protect tail latency: a model that
+keeps failing is skipped for a cool-down, and ``hedged`` sends a second
+request once the first has run past the model's recent p95.
+"""
+import asyncio
+import copy
+import hashlib
+import inspect
+import logging
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(provider: str, model: str, system_message: str, *parts: Union[str, bytes]) -> str:
+    digest = hashlib.sha256()
+    for part in (provider, model, system_message, *parts):
+        data = part.encode('utf-8') if isinstance(part, str) else part
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU, then MongoDB) cache of model responses."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # key -> response text
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _remember(self, key: str, value: str):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(self, db, key: str, input_bytes: int = 0) -> Optional[str]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+        else:
+            doc = await db.llm_cache.find_one({"key": key}, {"_id": 0, "response": 1})
+            if doc is None:
+                self.misses += 1
+                return None
+            value = doc['response']
+            self._remember(key, value)
+            self.db_hits += 1
+        # The request payload we did not send and the response we did not wait for
+        self.bytes_saved += input_bytes + len(value)
+        return value
+
+    async def put(self, db, key: str, value: str):
+        self._remember(key, value)
+        await db.llm_cache.update_one(
+            {"key": key},
+            {"$set": {"response": value, "created_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+class QueueFull(Exception):
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Too many pending requests for {model}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class ModelGate:
+    """Per-model concurrency limit with a bounded wait queue."""
+
+    def __init__(self, max_concurrency: int, max_waiting: int, retry_after: int = 2):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.waiting: Dict[str, int] = defaultdict(int)
+        self.active: Dict[str, int] = defaultdict(int)
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        semaphore = self.semaphores.setdefault(model, asyncio.Semaphore(self.max_concurrency))
+        if semaphore.locked() and self.waiting[model] >= self.max_waiting:
+            self.rejected += 1
+            raise QueueFull(model, self.retry_after)
+
+        self.waiting[model] += 1
+        started = time.monotonic()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[model] -= 1
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+        self.active[model] += 1
+        try:
+            yield
+        finally:
+            self.active[model] -= 1
+            semaphore.release()
+
+    @asynccontextmanager
+    async def spare_slot(self, model: str):
+        """Yield True while holding a slot if one is free right now, else False; never queues.
+
+        For optional extra work such as hedges, which must not push a model past its cap.
+        """
+        semaphore = self.semaphores.setdefault(model, asyncio.Semaphore(self.max_concurrency))
+        if semaphore.locked():
+            yield False
+            return
+        await semaphore.acquire()  # free, so this returns without suspending
+        self.active[model] += 1
+        try:
+            yield True
+        finally:
+            self.active[model] -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": dict(self.waiting),
+            "active": dict(self.active),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+class InFlight:
+    """Coalesces concurrent calls that share a content key into one upstream call."""
+
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        task = self.tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.started += 1
+            task = asyncio.ensure_future(call())
+            self.tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # shield: one caller disconnecting must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.tasks), "started": self.started, "coalesced": self.coalesced}
+
+
+def _snapshot(client) -> dict:
+    return {k: copy.copy(v) if isinstance(v, (list, dict)) else v for k, v in vars(client).items()}
+
+
+def _restore(client, state: dict):
+    # Chat clients keep conversation history on the instance; reset it between callers
+    for k, v in state.items():
+        setattr(client, k, copy.copy(v) if isinstance(v, (list, dict)) else v)
+
+
+async def _close_client(client):
+    for name in ("aclose", "close"):
+        close = getattr(client, name, None)
+        if callable(close):
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+
+class ClientPool:
+    """Idle chat clients per (provider, model, system prompt), lent to one caller at a time.
+
+    Clients are built lazily by ``factory`` on first use. A client is returned
+    to the pool with its just-built state restored. A client whose call raised
+    is dropped instead. Every checkout gets its own ``session_id``, so callers
+    never share provider-side history.
+
+    Only the client object's construction is amortized: ``LlmChat`` opens its
+    HTTP connection inside each ``send_message``, so connection setup and TLS
+    still happen once per call.
+    """
+
+    def __init__(self, factory: Callable[[str, str, str], Any], max_idle_per_key: int = 8):
+        self.factory = factory
+        self.max_idle_per_key = max_idle_per_key
+        self.idle: Dict[Tuple[str, str, str], List[Tuple[Any, dict]]] = {}
+        self.closed = False
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @asynccontextmanager
+    async def client(self, provider: str, model: str, system_message: str):
+        key = (provider, model, system_message)
+        idle = self.idle.setdefault(key, [])
+        if idle:
+            client, state = idle.pop()
+            if hasattr(client, 'session_id'):
+                client.session_id = str(uuid.uuid4())
+            self.reused += 1
+        else:
+            client = self.factory(provider, model, system_message)
+            state = _snapshot(client)
+            self.created += 1
+
+        try:
+            yield client
+        except BaseException:
+            self.discarded += 1
+            await _close_client(client)
+            raise
+        if self.closed or len(idle) >= self.max_idle_per_key:
+            await _close_client(client)
+            return
+        _restore(client, state)
+        idle.append((client, state))
+
+    async def close(self):
+        self.closed = True
+        idle, self.idle = self.idle, {}
+        for clients in idle.values():
+            for client, _ in clients:
+                await _close_client(client)
+
+    def stats(self) -> dict:
+        return {
+            "idle": sum(len(clients) for clients in self.idle.values()),
+            "created": self.created,
+            "reused": self.reused,
+            "discarded": self.discarded,
+        }
+
+
+class CircuitBreaker:
+    """Per-model breaker: opens after consecutive failures, half-opens after a cool-down."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.opened_at: Dict[str, float] = {}
+        self.trial_running: Dict[str, bool] = defaultdict(bool)
+        self.short_circuited = 0
+
+    def state(self, model: str) -> str:
+        opened_at = self.opened_at.get(model)
+        if opened_at is None:
+            return "closed"
+        if time.monotonic() - opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self, model: str) -> bool:
+        state = self.state(model)
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running[model]:
+            # Let exactly one trial call through to probe recovery
+            self.trial_running[model] = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self, model: str):
+        self.failures[model] = 0
+        self.opened_at.pop(model, None)
+        self.trial_running[model] = False
+
+    def cancel_trial(self, model: str):
+        """The allowed call never reached the model; let another caller probe."""
+        self.trial_running[model] = False
+
+    def record_failure(self, model: str):
+        self.failures[model] += 1
+        if self.trial_running[model] or self.failures[model] >= self.failure_threshold:
+            self.opened_at[model] = time.monotonic()
+        self.trial_running[model] = False
+
+    def stats(self) -> dict:
+        return {
+            "states": {model: self.state(model) for model in self.failures},
+            "consecutive_failures": dict(self.failures),
+            "short_circuited": self.short_circuited,
+        }
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model."""
+
+    def __init__(self, window: int = 200):
+        self.samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def observe(self, model: str, seconds: float):
+        self.samples[model].append(seconds)
+
+    def percentile(self, model: str, pct: float, min_samples: int = 20) -> Optional[float]:
+        samples = self.samples.get(model)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            model: {"p50": self.percentile(model, 50, 1), "p95": self.percentile(model, 95, 1)}
+            for model in self.samples
+        }
+
+
+async def hedged(
+    call: Callable[[], Awaitable[str]],
+    delay: Optional[float],
+    spare_slot: Optional[Callable[[], Any]] = None,
+) -> Tuple[str, bool]:
+    """Run ``call``; if it has not finished after ``delay`` seconds, race a second copy.
+
+    ``spare_slot`` (e.g. ``lambda: gate.spare_slot(model)``) admits the second
+    copy; when it yields False the hedge is skipped and the first call awaited.
+    Returns (result, whether a hedge was sent). The slower copy is cancelled, and
+    so is every copy if the caller is.
+    """
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        if delay is None:
+            return await first, False
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result(), False
+
+        async with spare_slot() if spare_slot else nullcontext(True) as admitted:
+            if not admitted:
+                return await first, False
+            pending.add(asyncio.ensure_future(call()))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), True
+            # Both failed; surface the original request's error
+            return first.result(), True
+    finally:
+        for task in pending:
+            task.cancel()
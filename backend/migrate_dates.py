@@ -0,0 +1,137 @@
+"""Online migration of ``created_at`` from ISO strings to native BSON dates.
+
+The app writes native dates and reads both formats (see the pagination notes
+in server.py), so this can run against live traffic. Each collection is
+walked in ``_id`` order in batches, and each batch is rewritten with one
+unordered ``bulk_write``. Every update also filters on the old string value, so
+a document changed since it was read is left alone rather than overwritten.
+
+Progress is checkpointed per collection in the ``migrations`` collection after
+every batch. A rerun resumes after the last checkpointed ``_id``, and a
+collection that has finished is skipped. ``docs_per_second`` caps the write
+rate so the migration does not compete with foreground queries.
+"""
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATION = "created_at_native_dates"
+COLLECTIONS = (
+    "users", "tasks", "transactions", "automations", "notifications", "disputes", "ledger_entries", "ledger_snapshots",
+)
+
+
+def parse_created_at(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Strings written by the app carry +00:00; treat any that do not as UTC too
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+async def _checkpoint(db, collection: str) -> dict:
+    doc = await db.migrations.find_one({"_id": f"{MIGRATION}:{collection}"})
+    return doc or {"last_id": None, "converted": 0, "unparseable": 0, "done": False}
+
+
+async def migrate_collection(
+    db,
+    collection: str,
+    batch_size: int = 1000,
+    docs_per_second: Optional[float] = 5000,
+) -> dict:
+    """Convert one collection, resuming from its checkpoint; returns the final checkpoint."""
+    state = await _checkpoint(db, collection)
+    if state['done']:
+        return state
+
+    while True:
+        query = {"created_at": {"$type": "string"}}
+        if state['last_id'] is not None:
+            query["_id"] = {"$gt": state['last_id']}
+        started = time.monotonic()
+        docs = await db[collection].find(query, {"_id": 1, "created_at": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+
+        updates = []
+        for doc in docs:
+            parsed = parse_created_at(doc['created_at'])
+            if parsed is None:
+                logger.warning(f"{collection} {doc['_id']}: cannot parse created_at {doc['created_at']!r}")
+                state['unparseable'] += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": doc['_id'], "created_at": doc['created_at']},
+                {"$set": {"created_at": parsed}}
+            ))
+        if updates:
+            result = await db[collection].bulk_write(updates, ordered=False)
+            state['converted'] += result.modified_count
+
+        state['last_id'] = docs[-1]['_id']
+        await db.migrations.update_one(
+            {"_id": f"{MIGRATION}:{collection}"},
+            {"$set": {
+                "last_id": state['last_id'],
+                "converted": state['converted'],
+                "unparseable": state['unparseable'],
+                "done": False,
+                "updated_at": datetime.now(timezone.utc),
+            }},
+            upsert=True
+        )
+
+        if docs_per_second:
+            # Sleep off whatever is left of this batch's time budget
+            budget = len(docs) / docs_per_second
+            elapsed = time.monotonic() - started
+            if elapsed < budget:
+                await asyncio.sleep(budget - elapsed)
+
+    state['done'] = True
+    await db.migrations.update_one(
+        {"_id": f"{MIGRATION}:{collection}"},
+        {"$set": {"done": True, "converted": state['converted'], "unparseable": state['unparseable'],
+                  "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return state
+
+
+async def migrate(
+    db,
+    collections: Iterable[str] = COLLECTIONS,
+    batch_size: int = 1000,
+    docs_per_second: Optional[float] = 5000,
+) -> dict:
+    report = {}
+    for collection in collections:
+        state = await migrate_collection(db, collection, batch_size, docs_per_second)
+        report[collection] = {"converted": state['converted'], "unparseable": state['unparseable']}
+        logger.info(f"{collection}: {report[collection]}")
+    return report
+
+
+async def _main() -> int:
+    from ops import connect
+
+    logging.basicConfig(level=logging.INFO)
+    docs_per_second = float(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    async with connect() as db:
+        report = await migrate(db, docs_per_second=docs_per_second or None)
+    for collection, counts in report.items():
+        print(f"{collection}: {counts['converted']} converted, {counts['unparseable']} unparseable")
+    return 1 if any(counts['unparseable'] for counts in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,170 @@
+"""Buffered notification writes and per-user unread counters.
+
+``NotificationWriter`` collects notifications in memory and flushes them with
+one ``insert_many`` when the buffer fills or every ``flush_interval`` seconds.
+Each user's unread count lives in ``notification_counters``. It is bumped by
+``$inc`` after every flush and decremented by the number of documents a
+mark-read actually changed, so reading the count is a single-document lookup.
+
+Read notifications get a native ``read_at`` date; the TTL index on it (see
+indexes.py) expires them, while unread ones are kept.
+"""
+import asyncio
+import logging
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+async def _adjust_unread(db, counts: Counter) -> None:
+    if counts:
+        await db.notification_counters.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$inc": {"unread": n}}, upsert=True)
+            for user_id, n in counts.items()
+        ], ordered=False)
+
+
+class NotificationWriter:
+    def __init__(self, db, max_batch: int = 500, flush_interval: float = 0.5, max_pending: int = 10000):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.buffer: List[dict] = []
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+
+    async def send(self, notification: dict) -> None:
+        self.buffer.append(notification)
+        if len(self.buffer) >= self.max_batch:
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self.lock:
+            batch, self.buffer = self.buffer, []
+            if not batch:
+                return 0
+            failed_at = set()
+            try:
+                await self.db.notifications.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # A duplicate id means an earlier, failed flush already stored that row
+                failed_at = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000}
+            except Exception:
+                logger.exception(f"Notification flush of {len(batch)} failed")
+                failed_at = set(range(len(batch)))
+            for doc in batch:
+                doc.pop('_id', None)  # insert_many sets it in place
+            failed = [doc for i, doc in enumerate(batch) if i in failed_at]
+            written = [doc for i, doc in enumerate(batch) if i not in failed_at]
+            if failed:
+                logger.warning(f"Keeping {len(failed)} notifications for the next flush")
+                pending = failed + self.buffer
+                self.dropped += max(0, len(pending) - self.max_pending)
+                self.buffer = pending[-self.max_pending:]
+            await _adjust_unread(self.db, Counter(doc['user_id'] for doc in written if not doc.get('read')))
+            self.written += len(written)
+            self.flushes += 1
+            return len(written)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Notification flush failed")
+
+    async def start(self):
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.buffer),
+            "written": self.written,
+            "flushes": self.flushes,
+            "avg_batch": self.written / self.flushes if self.flushes else 0.0,
+            "dropped": self.dropped,
+        }
+
+
+async def mark_read(db, user_id: str, query: dict) -> int:
+    """Mark the user's unread notifications matching ``query`` read in one ``update_many``."""
+    result = await db.notifications.update_many(
+        {**query, "user_id": user_id, "read": False},
+        {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}}
+    )
+    if result.modified_count:
+        await _adjust_unread(db, Counter({user_id: -result.modified_count}))
+    return result.modified_count
+
+
+async def mark_one_read(db, user_id: str, notif_id: str) -> bool:
+    """Mark one of the user's notifications read; False if the user has no such notification.
+
+    A single update: the owner is part of the filter, and the pipeline leaves an
+    already-read notification (and its ``read_at``) untouched, so only a real
+    unread-to-read change moves the counter.
+    """
+    result = await db.notifications.update_one(
+        {"id": notif_id, "user_id": user_id},
+        [{"$set": {"read": True, "read_at": {"$cond": ["$read", "$read_at", datetime.now(timezone.utc)]}}}]
+    )
+    if result.modified_count:
+        await _adjust_unread(db, Counter({user_id: -1}))
+    return result.matched_count == 1
+
+
+async def unread_count(db, user_id: str) -> int:
+    counter = await db.notification_counters.find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+    # A mark-read can land between a flush's insert and its $inc
+    return max(0, counter['unread']) if counter else 0
+
+
+async def rebuild_unread_counts(db) -> int:
+    """Recount unread notifications per user and overwrite the counters."""
+    counts = {
+        row['_id']: row['unread']
+        async for row in db.notifications.aggregate([
+            {"$match": {"read": False}},
+            {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}},
+        ])
+    }
+    await db.notification_counters.update_many(
+        {"user_id": {"$nin": list(counts)}}, {"$set": {"unread": 0}}
+    )
+    if counts:
+        await db.notification_counters.bulk_write([
+            UpdateOne({"user_id": user_id}, {"$set": {"unread": n}}, upsert=True)
+            for user_id, n in counts.items()
+        ], ordered=False)
+    return len(counts)
+
+
+async def _main() -> int:
+    from ops import connect
+
+    async with connect() as db:
+        users = await rebuild_unread_counts(db)
+    print(f"Rebuilt unread counters for {users} users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
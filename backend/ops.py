@@ -0,0 +1,27 @@
+"""Database connection for the maintenance and benchmark entry points.
+
+Modules that can be run directly (``python stats.py``, ``python ledger.py``...)
+connect through ``connect`` so they all read MONGO_URL and DB_NAME from
+backend/.env the same way server.py does.
+"""
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+@asynccontextmanager
+async def connect(database: Optional[str] = None, scratch: bool = False):
+    """Yield the app database, or ``database`` if named; a ``scratch`` database is dropped on exit."""
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), tz_aware=True)
+    name = database or os.environ.get('DB_NAME', 'test_database')
+    try:
+        yield client[name]
+    finally:
+        if scratch:
+            await client.drop_database(name)
+        client.close()
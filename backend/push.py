@@ -0,0 +1,160 @@
+"""Per-user push events: an in-process pub/sub, optionally fed by change streams.
+
+``EventBus`` fans each event out to the open ``/api/stream`` connections of the
+user it concerns. Each connection has a bounded queue. A connection that
+falls ``buffer_size`` events behind is dropped rather than allowed to grow
+memory, and its client reconnects and refetches.
+
+With one uvicorn worker, routes publish straight to the bus. With several
+workers or replicas, a route in one process cannot reach connections held by
+another, so ``watch_changes`` tails MongoDB change streams (replica set
+required) and republishes every relevant write in every process. Routes then
+leave publishing to it.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(buffer_size + 1)  # +1 leaves room for the drop marker
+        self.buffer_size = buffer_size
+        self.dropped = False
+
+    def offer(self, event: dict) -> bool:
+        if self.queue.qsize() >= self.buffer_size:
+            self.dropped = True
+            # Discard the backlog and wake the consumer with a close marker
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        """The next event; raises asyncio.TimeoutError when idle for ``timeout`` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self.subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.slow_consumers_dropped = 0
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(self.buffer_size)
+        self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: str, subscription: Subscription):
+        subscribers = self.subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[user_id]
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self.subscribers
+
+    def publish(self, user_id: str, event: str, data: dict):
+        self.published += 1
+        for subscription in list(self.subscribers.get(user_id, ())):
+            if subscription.offer({"event": event, "data": data}):
+                self.delivered += 1
+            else:
+                self.slow_consumers_dropped += 1
+                logger.warning(f"Dropping slow event stream consumer for {user_id}")
+                self.unsubscribe(user_id, subscription)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.subscribers),
+            "connections": sum(len(subs) for subs in self.subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "slow_consumers_dropped": self.slow_consumers_dropped,
+        }
+
+
+def _task_event(bus: EventBus, change: dict):
+    task = change.get('fullDocument')
+    fields = change.get('updateDescription', {}).get('updatedFields', {})
+    if task is None or 'status' not in fields:
+        return
+    data = {"task_id": task['id'], "status": task['status']}
+    for user_id in {task.get('created_by'), task.get('assigned_to')} - {None}:
+        bus.publish(user_id, "task_status", data)
+
+
+def _notification_event(bus: EventBus, change: dict):
+    notification = change['fullDocument']
+    notification.pop('_id', None)
+    bus.publish(notification['user_id'], "notification", notification)
+
+
+def _balance_event(bus: EventBus, change: dict):
+    user = change.get('fullDocument')
+    fields = change.get('updateDescription', {}).get('updatedFields', {})
+    if user is not None and 'wallet_balance' in fields:
+        # The value this write set, not whatever the lookup found later
+        bus.publish(user['id'], "balance", {"balance": fields['wallet_balance']})
+
+
+def _updates_of(field: str, document_fields: tuple) -> list:
+    """Updates that set ``field``, trimmed to what the handler publishes.
+
+    Filtering in the pipeline keeps the server from running the ``updateLookup``
+    for every other write to the collection (logins, ratings, profile edits).
+    """
+    changed = f"updateDescription.updatedFields.{field}"
+    return [
+        {"$match": {"operationType": "update", changed: {"$exists": True}}},
+        {"$project": {changed: 1, **{f"fullDocument.{name}": 1 for name in document_fields}}},
+    ]
+
+
+WATCHED = {
+    "tasks": (_updates_of("status", ("id", "status", "created_by", "assigned_to")), _task_event),
+    "notifications": ([{"$match": {"operationType": "insert"}}], _notification_event),
+    "users": (_updates_of("wallet_balance", ("id",)), _balance_event),
+}
+
+
+async def _watch(db, bus: EventBus, collection: str, retry_seconds: float):
+    pipeline, handle = WATCHED[collection]
+    resume_token = None
+    while True:
+        try:
+            async with db[collection].watch(
+                pipeline, full_document='updateLookup', resume_after=resume_token
+            ) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    try:
+                        handle(bus, change)
+                    except Exception:
+                        logger.exception(f"Bad {collection} change event")
+        except OperationFailure as e:
+            # 40573: "The $changeStream stage is only supported on replica sets"
+            if e.code == 40573:
+                logger.error("Change streams need a replica set; cross-worker push events are disabled")
+                return
+            logger.warning(f"{collection} change stream failed ({e}); resuming in {retry_seconds}s")
+        except PyMongoError as e:
+            logger.warning(f"{collection} change stream failed ({e}); resuming in {retry_seconds}s")
+        await asyncio.sleep(retry_seconds)
+
+
+async def watch_changes(db, bus: EventBus, retry_seconds: float = 2.0):
+    """Republish task status, notification and balance writes from every process."""
+    await asyncio.gather(*(_watch(db, bus, collection, retry_seconds) for collection in WATCHED))
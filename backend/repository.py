@@ -0,0 +1,150 @@
+"""Projection-scoped data access and per-request query accounting.
+
+Each function below reads only the fields its callers use, through a named
+projection. A route that needs a user's balance never pulls the bcrypt hash
+or the rest of the profile over the wire.
+
+``QueryAccounting`` is a pymongo command listener that attributes every round
+trip, and the bytes it returned, to the request that caused it. Requests are
+tracked by a context variable that ``start_request`` sets; Motor copies the
+context into its executor threads. The per-request totals are checked against
+``QUERY_BUDGETS``, so a change that adds a query or widens a projection on a
+hot route shows up as an over-budget warning. A test can also compare them
+with the budget directly.
+"""
+import contextvars
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import bson
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# ============= PROJECTIONS =============
+PROFILE_FIELDS = {"_id": 0, "password": 0, "name_lower": 0}
+LOGIN_FIELDS = {"_id": 0, "name_lower": 0}
+BALANCE_FIELDS = {"_id": 0, "wallet_balance": 1}
+ID_FIELDS = {"_id": 0, "id": 1}
+HELPER_CARD_FIELDS = {"_id": 0, "id": 1, "full_name": 1, "email": 1, "user_type": 1, "skills": 1, "rating": 1, "kyc_status": 1}
+AUTOMATION_TOGGLE_FIELDS = {"_id": 0, "active": 1, "schedule": 1}
+
+
+# ============= USERS =============
+async def email_exists(db, email: str) -> bool:
+    return await db.users.find_one({"email": email}, ID_FIELDS) is not None
+
+
+async def find_user_id_by_email(db, email: str) -> Optional[str]:
+    user = await db.users.find_one({"email": email}, ID_FIELDS)
+    return user['id'] if user else None
+
+
+async def find_login_user(db, email: str) -> Optional[dict]:
+    """Profile plus password hash, for verifying a login."""
+    return await db.users.find_one({"email": email}, LOGIN_FIELDS)
+
+
+async def find_profile(db, user_id: str) -> Optional[dict]:
+    return await db.users.find_one({"id": user_id}, PROFILE_FIELDS)
+
+
+async def get_wallet_balance(db, user_id: str) -> Optional[float]:
+    """The user's balance, or None if there is no such user."""
+    user = await db.users.find_one({"id": user_id}, BALANCE_FIELDS)
+    return user.get('wallet_balance', 0.0) if user else None
+
+
+async def list_helpers(db, limit: int = 50) -> List[dict]:
+    return await db.users.find({"user_type": "helper"}, HELPER_CARD_FIELDS).to_list(limit)
+
+
+# ============= TASKS / AUTOMATIONS =============
+async def find_task(db, task_id: str, projection: dict) -> Optional[dict]:
+    return await db.tasks.find_one({"id": task_id}, projection)
+
+
+async def find_automation_for_toggle(db, auto_id: str, user_id: str) -> Optional[dict]:
+    return await db.automations.find_one({"id": auto_id, "user_id": user_id}, AUTOMATION_TOGGLE_FIELDS)
+
+
+# ============= QUERY ACCOUNTING =============
+# (max round trips, max reply bytes) per route; routes not listed are tracked but unbounded.
+# ETag routes spend one round trip on the resource_versions lookup before the read itself.
+QUERY_BUDGETS: Dict[str, tuple] = {
+    "GET /api/users/profile": (2, 2_000),
+    "GET /api/users/wallet": (1, 200),
+    "GET /api/users/stats": (1, 1_000),
+    "GET /api/tasks": (2, 500_000),
+    "GET /api/tasks/{task_id}": (1, 5_000),
+    "GET /api/notifications/unread-count": (1, 200),
+    "POST /api/auth/login": (3, 2_000),
+    "POST /api/payments/send": (16, 4_000),
+}
+
+
+class RequestQueries:
+    __slots__ = ("round_trips", "bytes_returned")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.bytes_returned = 0
+
+
+_current: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar("request_queries", default=None)
+
+
+class QueryAccounting(monitoring.CommandListener):
+    def __init__(self):
+        self.enabled = False
+        self.routes: Dict[str, dict] = defaultdict(lambda: {"requests": 0, "round_trips": 0, "bytes": 0, "max_round_trips": 0, "max_bytes": 0, "over_budget": 0})
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        queries = _current.get()
+        if queries is None:
+            return
+        queries.round_trips += 1
+        # Re-encoding the reply is the price of exact byte counts; it only runs while enabled
+        queries.bytes_returned += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        queries = _current.get()
+        if queries is not None:
+            queries.round_trips += 1
+
+    def start_request(self) -> Optional[contextvars.Token]:
+        if not self.enabled:
+            return None
+        return _current.set(RequestQueries())
+
+    def finish_request(self, token: contextvars.Token, route: str) -> RequestQueries:
+        queries = _current.get()
+        _current.reset(token)
+        totals = self.routes[route]
+        totals["requests"] += 1
+        totals["round_trips"] += queries.round_trips
+        totals["bytes"] += queries.bytes_returned
+        totals["max_round_trips"] = max(totals["max_round_trips"], queries.round_trips)
+        totals["max_bytes"] = max(totals["max_bytes"], queries.bytes_returned)
+        if over_budget(route, queries):
+            totals["over_budget"] += 1
+            logger.warning(f"{route} used {queries.round_trips} queries / {queries.bytes_returned} bytes, budget {QUERY_BUDGETS[route]}")
+        return queries
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "routes": dict(self.routes)}
+
+
+def over_budget(route: str, queries: RequestQueries) -> bool:
+    budget = QUERY_BUDGETS.get(route)
+    if budget is None:
+        return False
+    max_round_trips, max_bytes = budget
+    return queries.round_trips > max_round_trips or queries.bytes_returned > max_bytes
+
+
+query_accounting = QueryAccounting()
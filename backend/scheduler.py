@@ -0,0 +1,234 @@
+"""In-process scheduler that fires due automations.
+
+Each automation's ``schedule`` is parsed into a ``next_run_at`` datetime, and
+the ``(active, next_run_at)`` index is the due-queue. Every tick, a scheduler
+claims due automations one ``find_one_and_update`` at a time: the claim pushes
+``next_run_at`` forward by a lease and stamps a claim token. Other workers and
+replicas stop seeing the row as due, so nothing fires twice. Once the run
+finishes, the next occurrence is written under that token. If a process dies
+mid-run, its lease runs out and the automation becomes due again. A live run
+is cut off ``lease_margin`` seconds before its lease expires, counting the
+wait for a concurrency slot, so it can never overlap a second firing.
+"""
+import asyncio
+import calendar
+import logging
+import re
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[[dict], Awaitable[None]]
+
+INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+# Fired by the task's due date, not by the clock
+EVENT_SCHEDULES = {"on_due_date"}
+EVERY = re.compile(r"^every (\d+) (minute|hour|day|week)s?$")
+
+
+def _add_month(when: datetime) -> datetime:
+    year, month = divmod(when.month, 12)
+    year, month = when.year + year, month + 1
+    day = min(when.day, calendar.monthrange(year, month)[1])
+    return when.replace(year=year, month=month, day=day)
+
+
+def next_run(schedule: str, after: datetime, now: Optional[datetime] = None) -> Optional[datetime]:
+    """The first occurrence of ``schedule`` after ``after`` that is later than ``now``.
+
+    Occurrences are stepped from the previous slot rather than from when the run
+    actually happened, so runs do not drift. Slots missed during downtime are
+    skipped, not replayed. Returns None for event-driven schedules and raises
+    ValueError for schedules this module cannot run.
+    """
+    normalized = schedule.strip().lower()
+    now = now or datetime.now(timezone.utc)
+    if normalized in EVENT_SCHEDULES:
+        return None
+    if normalized == "monthly":
+        step = _add_month
+    else:
+        interval = INTERVALS.get(normalized)
+        if interval is None:
+            match = EVERY.match(normalized)
+            if not match or int(match.group(1)) < 1:
+                raise ValueError(f"Unsupported schedule {schedule!r}")
+            interval = timedelta(**{f"{match.group(2)}s": int(match.group(1))})
+        step = lambda when: when + interval
+
+    when = step(after)
+    while when <= now:
+        when = step(when)
+    return when
+
+
+def _aware(when: datetime) -> datetime:
+    # Motor returns naive UTC datetimes unless the client is tz_aware
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        db,
+        run: Runner,
+        batch_size: int = 500,
+        concurrency: int = 50,
+        lease_seconds: int = 300,
+        lease_margin: float = 15.0,
+        tick_seconds: float = 15.0,
+        after_fire: Optional[Runner] = None,
+    ):
+        if lease_margin >= lease_seconds:
+            raise ValueError("lease_margin must be shorter than lease_seconds")
+        self.db = db
+        self.run = run
+        self.after_fire = after_fire  # called once the fired document holds its next slot
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.lease_margin = lease_margin
+        self.tick_seconds = tick_seconds
+        self.worker_id = str(uuid.uuid4())
+        self.task: Optional[asyncio.Task] = None
+        self.fired = 0
+        self.failed = 0
+        self.ticks = 0
+        self.last_tick_seconds = 0.0
+        self.lags: deque = deque(maxlen=1000)
+        self.max_lag = 0.0
+
+    async def backfill(self) -> int:
+        """Give active automations that predate the scheduler their first ``next_run_at``."""
+        now = datetime.now(timezone.utc)
+        updates = []
+        async for auto in self.db.automations.find(
+            {"active": True, "next_run_at": {"$exists": False}}, {"_id": 0, "id": 1, "schedule": 1}
+        ):
+            try:
+                when = next_run(auto['schedule'], now, now)
+            except ValueError:
+                logger.warning(f"Automation {auto['id']} has unsupported schedule {auto['schedule']!r}")
+                when = None
+            updates.append(UpdateOne({"id": auto['id']}, {"$set": {"next_run_at": when}}))
+        if updates:
+            await self.db.automations.bulk_write(updates, ordered=False)
+        return len(updates)
+
+    async def _claim(self, now: datetime, claim: str) -> Optional[dict]:
+        # The document as it was before the claim, so next_run_at is still the slot being fired
+        return await self.db.automations.find_one_and_update(
+            {"active": True, "next_run_at": {"$lte": now}},
+            {"$set": {
+                "next_run_at": now + timedelta(seconds=self.lease_seconds),
+                "claim": claim,
+                "claimed_by": self.worker_id,
+            }},
+            sort=[("next_run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def _fire(self, auto: dict, claim: str, gate: asyncio.Semaphore, lease_expires_at: float):
+        """Run one claimed automation; ``lease_expires_at`` is the claim's expiry on the loop clock."""
+        scheduled_for = _aware(auto['next_run_at'])
+        started = None
+        try:
+            async with asyncio.timeout_at(lease_expires_at - self.lease_margin):
+                async with gate:
+                    started = datetime.now(timezone.utc)
+                    lag = (started - scheduled_for).total_seconds()
+                    self.lags.append(lag)
+                    self.max_lag = max(self.max_lag, lag)
+                    await self.run(auto)
+        except Exception:
+            if started is None:
+                # Never got a slot before the lease ran low: hand the same slot back, still due
+                logger.warning(f"Automation {auto['id']} waited out its lease for a slot; releasing it")
+                await self.db.automations.update_one(
+                    {"id": auto['id'], "claim": claim},
+                    {"$set": {"next_run_at": scheduled_for}, "$unset": {"claim": "", "claimed_by": ""}}
+                )
+                return
+            logger.exception(f"Automation {auto['id']} failed")
+            self.failed += 1
+        else:
+            self.fired += 1
+        # Failed runs wait for their next slot like successful ones; no retry storm
+        await self.db.automations.update_one(
+            {"id": auto['id'], "claim": claim},
+            {"$set": {
+                "last_run": started,
+                "next_run_at": next_run(auto['schedule'], scheduled_for),
+            }, "$unset": {"claim": "", "claimed_by": ""}}
+        )
+        if self.after_fire:
+            try:
+                await self.after_fire(auto)
+            except Exception:
+                logger.exception(f"after_fire for automation {auto['id']} failed")
+
+    async def tick(self) -> int:
+        """Claim and run every automation due now, ``batch_size`` claims at a time."""
+        started = time.perf_counter()
+        gate = asyncio.Semaphore(self.concurrency)
+        total = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            # Both clocks read together: the claims below lease from ``now``
+            now, lease_expires_at = datetime.now(timezone.utc), loop.time() + self.lease_seconds
+            runs = []
+            for _ in range(self.batch_size):
+                claim = str(uuid.uuid4())
+                auto = await self._claim(now, claim)
+                if auto is None:
+                    break
+                runs.append(asyncio.ensure_future(self._fire(auto, claim, gate, lease_expires_at)))
+            await asyncio.gather(*runs)
+            total += len(runs)
+            if len(runs) < self.batch_size:
+                break
+        self.ticks += 1
+        self.last_tick_seconds = time.perf_counter() - started
+        return total
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Automation scheduler tick failed")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def start(self):
+        await self.backfill()
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        return {
+            "running": self.task is not None,
+            "ticks": self.ticks,
+            "fired": self.fired,
+            "failed": self.failed,
+            "last_tick_seconds": self.last_tick_seconds,
+            "lag_p50_seconds": lags[len(lags) // 2] if lags else 0.0,
+            "lag_p95_seconds": lags[min(len(lags) - 1, int(0.95 * len(lags)))] if lags else 0.0,
+            "lag_max_seconds": self.max_lag,
+        }
@@ -1,26 +1,52 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response, Header
 from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.formparsers import MultiPartParser
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
+from collections import OrderedDict
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 import base64
+import hashlib
+import contextlib
+import json
 from emergentintegrations.llm.chat import LlmChat, UserMessage, FileContentWithMimeType, ImageContent
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from indexes import ensure_indexes
+import stats
+import llm
+import ai_jobs
+import wallet
+import ledger
+import scheduler
+import notifications
+import push
+import helper_search
+import fastjson
+import repository
+import cache
+import versions
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
+# Listener counts round trips and reply bytes per request when QUERY_ACCOUNTING is on.
+# tz_aware: dates come back as UTC-aware datetimes, so every route serializes them with +00:00
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[repository.query_accounting])
 db = client[os.environ.get('DB_NAME', 'test_database')]
 
 # JWT Config
@@ -28,6 +54,94 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'doerly_secret_key')
 JWT_ALGORITHM = 'HS256'
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
 
+# Password hashing config
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+# More hashing threads than cores take CPU from the event loop thread itself
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+
+# Upload config
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 3 * 64 * 1024  # multiple of 3 so base64 chunks concatenate cleanly
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # multipart boundaries and the token field
+
+# LLM result cache config
+LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', '1024'))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))  # per model
+LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', '32'))  # per model
+LLM_HEDGE = os.environ.get('LLM_HEDGE', 'false').lower() == 'true'
+LLM_HEDGE_MAX_DELAY_SECONDS = float(os.environ.get('LLM_HEDGE_MAX_DELAY_SECONDS', '10'))
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+# "model:fallback|fallback,model:fallback" - tried in order while a model's breaker is open
+LLM_FALLBACK_MODELS = {
+    model: fallbacks.split('|')
+    for model, _, fallbacks in (
+        entry.partition(':') for entry in os.environ.get('LLM_FALLBACK_MODELS', 'gpt-5.1:gpt-4o').split(',') if entry
+    )
+}
+# Per-route deadlines (seconds) for the whole model call, including queueing
+AI_DEADLINES = {
+    "analyze-image": float(os.environ.get('AI_DEADLINE_ANALYZE_IMAGE', '45')),
+    "extract-task": float(os.environ.get('AI_DEADLINE_EXTRACT_TASK', '20')),
+    "extract-tasks": float(os.environ.get('AI_DEADLINE_EXTRACT_TASKS', '60')),
+    "analyze-document": float(os.environ.get('AI_DEADLINE_ANALYZE_DOCUMENT', '45')),
+}
+
+# AI job queue config
+AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', '4'))
+AI_JOB_LEASE_SECONDS = int(os.environ.get('AI_JOB_LEASE_SECONDS', '120'))
+AI_JOB_TIMEOUT_SECONDS = float(os.environ.get('AI_JOB_TIMEOUT_SECONDS', '90'))  # must stay below the lease
+AI_JOB_POLL_SECONDS = 2.0
+
+# Batch task extraction config
+EXTRACT_BATCH_MAX_TOKENS = int(os.environ.get('EXTRACT_BATCH_MAX_TOKENS', '4000'))
+EXTRACT_BATCH_MAX_ITEMS = int(os.environ.get('EXTRACT_BATCH_MAX_ITEMS', '25'))
+
+# Automation scheduler config
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', '15'))
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', '500'))
+SCHEDULER_CONCURRENCY = int(os.environ.get('SCHEDULER_CONCURRENCY', '50'))
+SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', '300'))
+
+# Notification writer config
+NOTIFY_MAX_BATCH = int(os.environ.get('NOTIFY_MAX_BATCH', '500'))
+NOTIFY_FLUSH_SECONDS = float(os.environ.get('NOTIFY_FLUSH_SECONDS', '0.5'))
+
+# Per-request Mongo round-trip and byte accounting (X-DB-Queries / X-DB-Bytes headers)
+QUERY_ACCOUNTING = os.environ.get('QUERY_ACCOUNTING', 'false').lower() == 'true'
+repository.query_accounting.enabled = QUERY_ACCOUNTING
+
+# Read-through cache config (profile, wallet, helper list)
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', '10000'))
+# Shared tier, e.g. redis://localhost:6379/0; without it each worker caches on its own
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+# Bounds how long another worker's in-process copy can lag a write; raise it only for single-worker deploys
+CACHE_LOCAL_TTL_SECONDS = float(os.environ.get('CACHE_LOCAL_TTL_SECONDS', '2'))
+CACHE_TTLS = {
+    "wallet": float(os.environ.get('CACHE_TTL_WALLET', '30')),
+    "helpers": float(os.environ.get('CACHE_TTL_HELPERS', '60')),
+}
+
+# Conditional GET config
+ETAGS_ENABLED = os.environ.get('ETAGS_ENABLED', 'true').lower() == 'true'
+# The helper list is the same for everyone and may be a little stale; per-user resources always revalidate
+HELPERS_MAX_AGE_SECONDS = int(os.environ.get('HELPERS_MAX_AGE_SECONDS', '30'))
+
+# Response encoding config
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'true').lower() == 'true'
+# Re-check fast-path list responses against their models; turn on in debug and test runs
+FAST_JSON_VALIDATE = os.environ.get('FAST_JSON_VALIDATE', 'false').lower() == 'true'
+
+# Push event stream config
+STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', '100'))  # events per connection
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+# Needs a replica set; turn on when running more than one worker
+STREAM_CHANGE_STREAMS = os.environ.get('STREAM_CHANGE_STREAMS', 'false').lower() == 'true'
+
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
@@ -37,6 +151,7 @@ class UserRegister(BaseModel):
     password: str
     full_name: str
     user_type: str = 'user'  # user or helper
+    skills: List[str] = Field(default_factory=list, max_length=50)  # helpers only
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -50,6 +165,9 @@ class User(BaseModel):
     user_type: str
     wallet_balance: float = 0.0
     kyc_status: str = 'pending'
+    skills: List[str] = Field(default_factory=list)
+    rating: float = 0.0
+    last_active_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TaskCreate(BaseModel):
@@ -91,6 +209,7 @@ class Automation(BaseModel):
     schedule: str
     active: bool = True
     last_run: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Notification(BaseModel):
@@ -114,12 +233,35 @@ class Dispute(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # ============= AUTH UTILITIES =============
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+password_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def _run_password_job(func, *args):
+    # Shed load instead of queueing unboundedly behind a login storm
+    if password_slots.locked():
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    async with password_slots:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+async def hash_password(password: str) -> str:
+    return await _run_password_job(_hash_password, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_password_job(_verify_password, password, hashed)
+
+def password_needs_rehash(hashed: str) -> bool:
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 def create_token(user_id: str) -> str:
     payload = {
         'user_id': user_id,
@@ -127,12 +269,236 @@ def create_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(token: str) -> str:
+class TokenCache:
+    """Bounded LRU of verified tokens; entries are dropped once their JWT exp passes."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()  # token -> (user_id, exp timestamp)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[str]:
+        entry = self.entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, exp = entry
+        if exp <= datetime.now(timezone.utc).timestamp():
+            del self.entries[token]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(token)
+        self.hits += 1
+        return user_id
+
+    def put(self, token: str, user_id: str, exp: float):
+        self.entries[token] = (user_id, exp)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+token_cache = TokenCache(AUTH_CACHE_SIZE)
+
+async def get_current_user(token: Optional[str]) -> str:
+    if not token:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload['user_id']
+        user_id = payload['user_id']
     except:
         raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache.put(token, user_id, payload['exp'])
+    return user_id
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith('bearer '):
+        return authorization[7:].strip()
+    return None
+
+async def current_user_id(
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+) -> str:
+    """Auth dependency: `Authorization: Bearer` header, falling back to the legacy `token` query param."""
+    return await get_current_user(bearer_token(authorization) or token)
+
+# ============= PAGINATION =============
+PAGE_SORT = [("created_at", -1), ("id", -1)]
+
+# created_at is a native date on new documents and an ISO string on rows the date
+# migration (migrate_dates.py) has not reached yet. BSON orders every string before
+# every date, so a newest-first sort lists all dates, then all strings, which is also
+# chronological order. Cursors record which kind they stopped on.
+def encode_cursor(doc: dict) -> str:
+    created_at = doc['created_at']
+    if isinstance(created_at, datetime):
+        created_at = {"$date": created_at.isoformat()}
+    raw = json.dumps([created_at, doc['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('utf-8')
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        if isinstance(created_at, dict):
+            created_at = datetime.fromisoformat(created_at["$date"])
+        return created_at, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def created_before(cursor: str, inclusive: bool = False) -> dict:
+    """Filter for rows after ``cursor`` in PAGE_SORT order (or at it, when ``inclusive``)."""
+    created_at, doc_id = decode_cursor(cursor)
+    clauses = [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lte" if inclusive else "$lt": doc_id}},
+    ]
+    if isinstance(created_at, datetime):
+        # Unmigrated rows sort after every date but never match a date comparison
+        clauses.append({"created_at": {"$type": "string"}})
+    return {"$or": clauses}
+
+async def paginate(collection, query: dict, limit: int, after: Optional[str], response: Response, projection: Optional[dict] = None) -> list:
+    """Keyset page over (created_at, id) newest first; sets X-Next-Cursor when more rows exist."""
+    if after:
+        query = {**query, **created_before(after)}
+    docs = await collection.find(query, projection or {"_id": 0}).sort(PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers['X-Next-Cursor'] = encode_cursor(docs[-1])
+    return docs
+
+# ============= PUSH EVENT UTILITIES =============
+event_bus = push.EventBus(STREAM_BUFFER_SIZE)
+
+def publish(user_id: str, event: str, data: dict):
+    # With change streams on, the watcher republishes every write, this process's included
+    if not STREAM_CHANGE_STREAMS:
+        event_bus.publish(user_id, event, data)
+
+async def publish_balance(*user_ids: str):
+    for user_id in user_ids:
+        if STREAM_CHANGE_STREAMS or not event_bus.has_subscribers(user_id):
+            continue
+        balance = await repository.get_wallet_balance(db, user_id)
+        if balance is not None:
+            event_bus.publish(user_id, "balance", {"balance": balance})
+
+# ============= RESPONSE UTILITIES =============
+CARRIED_HEADERS = ('X-Next-Cursor', 'ETag', 'Cache-Control', 'Vary')
+
+def fast_response(content, annotation=None, response: Optional[Response] = None):
+    """Encode Mongo documents straight to JSON instead of through ``response_model``.
+
+    Returns ``content`` untouched when FAST_JSON_RESPONSES is off, so the route's
+    usual FastAPI serialization applies. Headers set on ``response`` are carried over.
+    """
+    if not FAST_JSON_RESPONSES:
+        return content
+    if FAST_JSON_VALIDATE and annotation is not None:
+        fastjson.validate(annotation, content)
+    headers = None
+    if response is not None:
+        headers = {name: response.headers[name] for name in CARRIED_HEADERS if name in response.headers}
+    return fastjson.FastJSONResponse(content, headers=headers)
+
+# ============= NOTIFICATION UTILITIES =============
+notification_writer = notifications.NotificationWriter(
+    db, max_batch=NOTIFY_MAX_BATCH, flush_interval=NOTIFY_FLUSH_SECONDS
+)
+
+async def notify(user_id: str, message: str, task_id: Optional[str] = None):
+    notification = Notification(user_id=user_id, task_id=task_id, message=message)
+    notif_dict = notification.model_dump()
+    await notification_writer.send(notif_dict)
+    publish(user_id, "notification", dict(notif_dict))
+
+# ============= UPLOAD UTILITIES =============
+UPLOAD_PATHS = {"/api/ai/analyze-image", "/api/ai/analyze-image/stream", "/api/ai/analyze-document"}
+upload_stats = {"accepted": 0, "rejected": 0, "spooled_to_disk": 0, "largest_bytes": 0}
+
+async def scan_upload(file: UploadFile) -> str:
+    """Size-check and hash an upload in chunks, rejecting it as soon as it passes MAX_UPLOAD_BYTES.
+
+    Starlette has already spooled the part (in memory up to MultiPartParser.max_file_size, on disk
+    beyond), so this reads that file in place rather than copying it. Returns the SHA-256 hex
+    digest with ``file`` rewound for the route to read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            upload_stats['rejected'] += 1
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+        digest.update(chunk)
+    await file.seek(0)
+    upload_stats['accepted'] += 1
+    upload_stats['largest_bytes'] = max(upload_stats['largest_bytes'], size)
+    if size > MultiPartParser.max_file_size:
+        upload_stats['spooled_to_disk'] += 1
+    return digest.hexdigest()
+
+def base64_from_file(fileobj) -> str:
+    """Base64-encode a file chunk by chunk so the raw bytes are never held in memory alongside the encoding."""
+    encoded = []
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        encoded.append(base64.b64encode(chunk).decode('ascii'))
+    return ''.join(encoded)
+
+# ============= READ CACHE / ETAGS =============
+read_cache = cache.ReadThroughCache(
+    CACHE_SIZE,
+    shared=cache.RedisCache(CACHE_REDIS_URL) if CACHE_REDIS_URL else None,
+    local_ttl=CACHE_LOCAL_TTL_SECONDS,
+    enabled=CACHE_ENABLED,
+)
+etag_stats = {"checked": 0, "not_modified": 0}
+
+async def resources_changed(*keys: str):
+    """Call after a write: drops cached copies of ``keys`` and bumps their ETag versions."""
+    await read_cache.invalidate(*keys)
+    if ETAGS_ENABLED:
+        await versions.bump(db, *keys)
+
+async def check_etag(
+    request: Request, response: Response, key: str, cache_control: str = "private, no-cache"
+) -> Tuple[Optional[Response], str]:
+    """Tag ``response`` with the current ETag of ``key``; the 304 to return when the client already has it.
+
+    Also returns the read_cache key for the body: ``key`` pinned to the version the tag was computed
+    from. Invalidation only reaches the writer's process, so another worker's cached body must never
+    go out under a newer tag; after a bump it simply misses.
+    """
+    if not ETAGS_ENABLED:
+        return None, key
+    version = await versions.current(db, key)
+    tag = versions.etag(key, version, request.query_params.multi_items())
+    headers = {"ETag": tag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    etag_stats['checked'] += 1
+    if versions.matches(request.headers.get('if-none-match'), tag):
+        etag_stats['not_modified'] += 1
+        return Response(status_code=304, headers=headers), key
+    response.headers.update(headers)
+    return None, cache.versioned_key(key, version)
 
 # ============= ROOT ROUTE =============
 @api_router.get("/")
@@ -142,31 +508,54 @@ async def root():
 # ============= AUTH ROUTES =============
 @api_router.post("/auth/register")
 async def register(user_data: UserRegister):
-    existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
-    if existing:
+    if await repository.email_exists(db, user_data.email):
         raise HTTPException(status_code=400, detail="Email already exists")
     
     user = User(
         email=user_data.email,
         full_name=user_data.full_name,
-        user_type=user_data.user_type
+        user_type=user_data.user_type,
+        skills=helper_search.normalize_skills(user_data.skills)
     )
+    if user.user_type == 'helper':
+        user.last_active_at = user.created_at
     
     user_dict = user.model_dump()
-    user_dict['password'] = hash_password(user_data.password)
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
+    user_dict['password'] = await hash_password(user_data.password)
+    if user.user_type == 'helper':
+        user_dict.update(helper_search.search_fields(user.full_name, user.skills))
     
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent sign-up; email_unique caught it
+        raise HTTPException(status_code=400, detail="Email already exists")
+    if user.user_type == 'helper':
+        await resources_changed(cache.HELPERS_KEY)
     token = create_token(user.id)
     
     return {"token": token, "user": user}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc['password']):
+    user_doc = await repository.find_login_user(db, credentials.email)
+    if not user_doc or not await verify_password(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade the stored hash transparently when BCRYPT_ROUNDS changes
+    if password_needs_rehash(user_doc['password']):
+        new_hash = await hash_password(credentials.password)
+        await db.users.update_one(
+            {"id": user_doc['id'], "password": user_doc['password']},
+            {"$set": {"password": new_hash}}
+        )
+    
+    if user_doc.get('user_type') == 'helper':
+        # Feeds the "recent" sort of helper search
+        user_doc['last_active_at'] = datetime.now(timezone.utc)
+        await db.users.update_one({"id": user_doc['id']}, {"$set": {"last_active_at": user_doc['last_active_at']}})
+        await resources_changed(cache.profile_key(user_doc['id']))
+    
     if isinstance(user_doc['created_at'], str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
@@ -177,39 +566,54 @@ async def login(credentials: UserLogin):
 
 # ============= USER ROUTES =============
 @api_router.get("/users/profile")
-async def get_profile(token: str):
-    user_id = await get_current_user(token)
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+async def get_profile(request: Request, response: Response, user_id: str = Depends(current_user_id)):
+    # The version lookup is paid on every request anyway; a cache hit would only save one point read
+    not_modified, _ = await check_etag(request, response, cache.profile_key(user_id))
+    if not_modified:
+        return not_modified
+    user = await repository.find_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @api_router.get("/users/wallet")
-async def get_wallet(token: str):
-    user_id = await get_current_user(token)
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user:
+async def get_wallet(user_id: str = Depends(current_user_id)):
+    # Shared tier only: a payment's invalidation reaches it from any worker, unlike the local LRU
+    balance = await read_cache.get_or_load(
+        cache.wallet_key(user_id), CACHE_TTLS["wallet"], lambda: repository.get_wallet_balance(db, user_id),
+        local=False
+    )
+    if balance is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"balance": user.get('wallet_balance', 0.0)}
+    return {"balance": balance}
+
+@api_router.get("/users/stats")
+async def get_user_stats(user_id: str = Depends(current_user_id)):
+    return await stats.get_user_stats(db, user_id)
 
 @api_router.delete("/users/account")
-async def delete_account(token: str):
-    user_id = await get_current_user(token)
-    
+async def delete_account(user_id: str = Depends(current_user_id)):
+    # Pay out and close the ledger account first so the money history still balances
+    await wallet.close(db, user_id)
     # Delete user data
     await db.users.delete_one({"id": user_id})
     await db.tasks.delete_many({"created_by": user_id})
     await db.automations.delete_many({"user_id": user_id})
     await db.notifications.delete_many({"user_id": user_id})
+    await stats.forget_user(db, user_id)  # reads the transactions deleted next
     await db.transactions.delete_many({"from_user": user_id})
+    await db.notification_counters.delete_one({"user_id": user_id})
+    await resources_changed(
+        *cache.user_keys(user_id), versions.tasks_key(user_id), versions.automations_key(user_id), cache.HELPERS_KEY
+    )
     
     return {"success": True, "message": "Account deleted successfully"}
 
 # ============= TASK ROUTES =============
+TASK_PROJECTION = {"_id": 0, **dict.fromkeys(Task.model_fields, 1)}
+
 @api_router.post("/tasks", response_model=Task)
-async def create_task(task_data: TaskCreate, token: str):
-    user_id = await get_current_user(token)
-    
+async def create_task(task_data: TaskCreate, user_id: str = Depends(current_user_id)):
     task = Task(
         title=task_data.title,
         description=task_data.description,
@@ -220,158 +624,695 @@ async def create_task(task_data: TaskCreate, token: str):
     )
     
     task_dict = task.model_dump()
-    task_dict['created_at'] = task_dict['created_at'].isoformat()
     
     await db.tasks.insert_one(task_dict)
+    await resources_changed(versions.tasks_key(user_id))
+    await stats.record_task_created(db, user_id, task.status, task.estimated_cost)
     return task
 
 @api_router.get("/tasks", response_model=List[Task])
-async def get_tasks(token: str):
-    user_id = await get_current_user(token)
-    tasks = await db.tasks.find({"created_by": user_id}, {"_id": 0}).to_list(100)
-    
-    for task in tasks:
-        if isinstance(task['created_at'], str):
-            task['created_at'] = datetime.fromisoformat(task['created_at'])
-    
-    return tasks
+async def get_tasks(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user_id: str = Depends(current_user_id),
+):
+    not_modified, _ = await check_etag(request, response, versions.tasks_key(user_id))
+    if not_modified:
+        return not_modified
+    tasks = await paginate(db.tasks, {"created_by": user_id}, limit, after, response, TASK_PROJECTION)
+    return fast_response(tasks, List[Task], response)
 
-@api_router.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: str, token: str):
-    await get_current_user(token)
-    task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
+@api_router.get("/tasks/{task_id}", response_model=Task, dependencies=[Depends(current_user_id)])
+async def get_task(task_id: str):
+    task = await repository.find_task(db, task_id, TASK_PROJECTION)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    if isinstance(task['created_at'], str):
-        task['created_at'] = datetime.fromisoformat(task['created_at'])
-    
-    return task
+    return fast_response(task, Task)
 
-@api_router.patch("/tasks/{task_id}/status")
-async def update_task_status(task_id: str, status: str, token: str):
-    await get_current_user(token)
-    result = await db.tasks.update_one({"id": task_id}, {"$set": {"status": status}})
-    if result.modified_count == 0:
+@api_router.patch("/tasks/{task_id}/status", dependencies=[Depends(current_user_id)])
+async def update_task_status(task_id: str, status: str):
+    previous = await db.tasks.find_one_and_update(
+        {"id": task_id, "status": {"$ne": status}},
+        {"$set": {"status": status}},
+        projection={"_id": 0, "created_by": 1, "assigned_to": 1, "status": 1}
+    )
+    if not previous:
         raise HTTPException(status_code=404, detail="Task not found")
+    await resources_changed(versions.tasks_key(previous['created_by']))
+    await stats.record_task_status_change(db, previous['created_by'], previous['status'], status)
+    for party in {previous['created_by'], previous.get('assigned_to')} - {None}:
+        publish(party, "task_status", {"task_id": task_id, "status": status})
     return {"success": True}
 
-# ============= AI ROUTES =============
-@api_router.post("/ai/analyze-image")
-async def analyze_image(file: UploadFile = File(...), token: str = Form(...)):
-    await get_current_user(token)
+# ============= AI UTILITIES =============
+llm_cache = llm.ResultCache(LLM_CACHE_SIZE)
+llm_gate = llm.ModelGate(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+llm_inflight = llm.InFlight()
+
+def _new_llm_client(provider: str, model: str, system_message: str) -> LlmChat:
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=str(uuid.uuid4()),
+        system_message=system_message
+    ).with_model(provider, model)
+
+llm_clients = llm.ClientPool(_new_llm_client)
+llm_breakers = llm.CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+llm_latency = llm.LatencyTracker()
+llm_hedges_sent = 0
+
+async def _send_to_model(provider: str, model: str, system_message: str, message: UserMessage) -> str:
+    global llm_hedges_sent
+    
+    async def send_once() -> str:
+        started = time.monotonic()
+        async with llm_clients.client(provider, model, system_message) as chat:
+            response = await chat.send_message(message)
+        llm_latency.observe(model, time.monotonic() - started)
+        return response
+    
+    delay = None
+    if LLM_HEDGE:
+        p95 = llm_latency.percentile(model, 95)
+        delay = min(p95, LLM_HEDGE_MAX_DELAY_SECONDS) if p95 is not None else None
+    # The caller holds one gate slot; a hedge needs a second one, or is not sent
+    response, hedge_sent = await llm.hedged(send_once, delay, lambda: llm_gate.spare_slot(model))
+    llm_hedges_sent += hedge_sent
+    return response
+
+def cache_bypassed(cache_control: Optional[str]) -> bool:
+    return bool(cache_control) and 'no-cache' in cache_control.lower()
+
+async def cached_llm_call(
+    provider: str,
+    model: str,
+    system_message: str,
+    message: UserMessage,
+    key_parts: tuple,
+    bypass_cache: bool = False,
+    input_bytes: Optional[int] = None,
+    deadline: float = 30.0,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Send ``message`` unless a response for the same (model, prompt, input) is already cached.
+
+    Misses are coalesced with identical in-flight calls and admitted through the per-model
+    gate, which raises 429 when the model's wait queue is full. The call must finish within
+    ``deadline`` seconds (504 otherwise); while ``model``'s breaker is open its fallback chain
+    is used instead (503 when every candidate is open).
+
+    ``key_parts`` must identify everything in the message, e.g. the prompt text and the upload digest;
+    ``input_bytes`` is the payload size credited to bytes_saved on a hit (defaults to the key parts' size).
+    Responses ``cache_if`` rejects (e.g. output that does not parse) are returned but not cached.
+    """
+    key = llm.content_key(provider, model, system_message, *key_parts)
+    if not bypass_cache:
+        if input_bytes is None:
+            input_bytes = sum(len(part) for part in key_parts)
+        cached = await llm_cache.get(db, key, input_bytes)
+        if cached is not None:
+            return cached
+    
+    async def call_model() -> str:
+        for candidate in [model] + LLM_FALLBACK_MODELS.get(model, []):
+            if not llm_breakers.allow(candidate):
+                continue
+            try:
+                async with llm_gate.slot(candidate):
+                    # Bound the upstream call itself so a hung provider frees its slot and trips the breaker
+                    response = await asyncio.wait_for(
+                        _send_to_model(provider, candidate, system_message, message), deadline
+                    )
+            except llm.QueueFull:
+                llm_breakers.cancel_trial(candidate)
+                raise
+            except Exception:
+                llm_breakers.record_failure(candidate)
+                raise
+            except BaseException:
+                llm_breakers.cancel_trial(candidate)  # cancelled: no verdict on the model
+                raise
+            llm_breakers.record_success(candidate)
+            # A fallback model's answer must not be served later as the primary model's
+            if candidate == model and (cache_if is None or cache_if(response)):
+                await llm_cache.put(db, key, response)
+            return response
+        raise HTTPException(status_code=503, detail="AI service unavailable, please retry", headers={"Retry-After": "30"})
     
     try:
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=str(uuid.uuid4()),
-            system_message="You are an AI that extracts tasks and information from images."
-        ).with_model("openai", "gpt-4o")
-        
+        return await asyncio.wait_for(llm_inflight.run(key, call_model), deadline)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="AI service timed out")
+    except llm.QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="AI service is busy, please retry",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def stream_llm_events(
+    provider: str,
+    model: str,
+    system_message: str,
+    message: UserMessage,
+    key_parts: tuple,
+    result_field: str,
+    bypass_cache: bool = False,
+    deadline: float = 30.0,
+):
+    """Server-Sent Events for one model call: ``start``, ``delta`` chunks as they arrive, then ``done`` or ``error``.
+
+    Chunks are forwarded from the client's ``stream_message`` when it offers one; otherwise the full
+    response arrives as a single delta. The assembled response is validated as JSON and, only if it
+    parses, cached like ``cached_llm_call`` results. ``deadline`` bounds the time spent waiting on the
+    gate and the model; time the client takes to read events is not counted.
+    """
+    yield sse_event("start", {"model": model})
+    key = llm.content_key(provider, model, system_message, *key_parts)
+    if not bypass_cache:
+        cached = await llm_cache.get(db, key, sum(len(part) for part in key_parts))
+        if cached is not None:
+            yield sse_event("delta", {"text": cached})
+            yield sse_event("done", {result_field: cached, "cached": True})
+            return
+    
+    candidate = next((m for m in [model] + LLM_FALLBACK_MODELS.get(model, []) if llm_breakers.allow(m)), None)
+    if candidate is None:
+        yield sse_event("error", {"status": 503, "detail": "AI service unavailable, please retry"})
+        return
+    
+    chunks = []
+    error = None
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            # The deadline covers the gate, the call and every chunk, but never a yield:
+            # a timeout firing while suspended would cancel whatever the consumer is awaiting
+            async with asyncio.timeout_at(deadline_at):
+                await stack.enter_async_context(llm_gate.slot(candidate))
+                chat = await stack.enter_async_context(llm_clients.client(provider, candidate, system_message))
+            stream = getattr(chat, 'stream_message', None)
+            pieces = stream(message) if stream is not None else _single_piece(chat.send_message(message))
+            while True:
+                async with asyncio.timeout_at(deadline_at):
+                    piece = await anext(pieces, None)
+                if piece is None:
+                    break
+                chunks.append(piece)
+                suspended = loop.time()
+                yield sse_event("delta", {"text": piece})
+                deadline_at += loop.time() - suspended  # a slow client is not a slow model
+    except llm.QueueFull as e:
+        llm_breakers.cancel_trial(candidate)
+        error = {"status": 429, "detail": "AI service is busy, please retry", "retry_after": e.retry_after}
+    except TimeoutError:
+        llm_breakers.record_failure(candidate)
+        error = {"status": 504, "detail": "AI service timed out"}
+    except Exception as e:
+        llm_breakers.record_failure(candidate)
+        error = {"status": 502, "detail": str(e)}
+    except BaseException:
+        # Client went away (GeneratorExit / CancelledError): free a half-open trial for the next caller
+        llm_breakers.cancel_trial(candidate)
+        raise
+    if error is not None:
+        yield sse_event("error", error)
+        return
+    llm_breakers.record_success(candidate)
+    
+    response = "".join(chunks)
+    try:
+        parsed = parse_json_payload(response)
+    except ValueError:
+        parsed = None
+    # Unparseable output is not cached, so the next request gets a fresh answer
+    if candidate == model and parsed is not None:
+        await llm_cache.put(db, key, response)
+    yield sse_event("done", {result_field: response, "parsed": parsed, "valid": parsed is not None, "cached": False})
+
+async def _single_piece(response):
+    yield await response
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============= AI ROUTES =============
+IMAGE_SYSTEM_MESSAGE = "You are an AI that extracts tasks and information from images."
+IMAGE_PROMPT = "Analyze this image and extract any tasks, bills, forms, or actionable items. Return a structured JSON with: title, description, urgency (low/medium/high), estimated_cost."
+EXTRACT_SYSTEM_MESSAGE = "Extract actionable tasks from user input."
+DOCUMENT_SYSTEM_MESSAGE = "You extract text and actionable items from documents."
+DOCUMENT_PROMPT = "Extract all text and actionable items from this document."
+
+def extract_prompt(text: str) -> str:
+    return f"Extract task from: {text}. Return JSON with title, description, task_type (ai/helper), urgency."
+
+async def run_image_analysis(base64_image: str, digest: str, bypass_cache: bool = False) -> dict:
+    try:
         image_content = ImageContent(image_base64=base64_image)
         message = UserMessage(
-            text="Analyze this image and extract any tasks, bills, forms, or actionable items. Return a structured JSON with: title, description, urgency (low/medium/high), estimated_cost.",
+            text=IMAGE_PROMPT,
             file_contents=[image_content]
         )
         
-        response = await chat.send_message(message)
+        response = await cached_llm_call(
+            "openai", "gpt-4o", IMAGE_SYSTEM_MESSAGE,
+            message, (IMAGE_PROMPT, digest), bypass_cache,
+            input_bytes=len(IMAGE_PROMPT) + len(base64_image),
+            deadline=AI_DEADLINES["analyze-image"]
+        )
         return {"analysis": response}
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e), "analysis": "Unable to analyze image"}
 
-@api_router.post("/ai/extract-task")
-async def extract_task(text: str, token: str):
-    await get_current_user(token)
-    
+async def run_task_extraction(text: str, bypass_cache: bool = False) -> dict:
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=str(uuid.uuid4()),
-            system_message="Extract actionable tasks from user input."
-        ).with_model("openai", "gpt-5.1")
+        prompt = extract_prompt(text)
+        message = UserMessage(text=prompt)
         
-        message = UserMessage(
-            text=f"Extract task from: {text}. Return JSON with title, description, task_type (ai/helper), urgency."
+        response = await cached_llm_call(
+            "openai", "gpt-5.1", EXTRACT_SYSTEM_MESSAGE,
+            message, (prompt,), bypass_cache,
+            deadline=AI_DEADLINES["extract-task"]
         )
-        
-        response = await chat.send_message(message)
         return {"task_suggestion": response}
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
-@api_router.post("/ai/analyze-document")
-async def analyze_document(file: UploadFile = File(...), token: str = Form(...)):
-    await get_current_user(token)
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text, plus numbering/separator overhead
+    return len(text) // 4 + 8
+
+def pack_batches(texts: List[str]) -> List[List[int]]:
+    """Greedily group input indices into batches that fit the per-call token and item budgets."""
+    batches, current, current_tokens = [], [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > EXTRACT_BATCH_MAX_TOKENS or len(current) >= EXTRACT_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_json_payload(response: str):
+    """Parse model output that may wrap its JSON in a ```json fence."""
+    payload = response.strip()
+    if payload.startswith("```"):
+        payload = payload.split("\n", 1)[1] if "\n" in payload else ""
+        payload = payload.rsplit("```", 1)[0]
+    return json.loads(payload)
+
+def parsed_json_array(response: str) -> bool:
+    try:
+        return isinstance(parse_json_payload(response), list)
+    except ValueError:
+        return False
+
+def _error_detail(error: Exception) -> str:
+    return error.detail if isinstance(error, HTTPException) else (str(error) or error.__class__.__name__)
+
+async def run_batch_extraction(texts: List[str], bypass_cache: bool = False) -> tuple:
+    """Extract one task per text using as few model calls as the budgets allow.
+
+    Returns (results in input order, number of model calls made). Each result is either
+    ``{"task_suggestion": <dict>}`` or ``{"error": <str>}``, whichever call produced it.
+    A batch that fails (busy gate, open breaker, timeout) marks only its own inputs as errors;
+    inputs a successful batch dropped are retried one by one, at most the gate's concurrency at a time.
+    """
+    results: List[dict] = [None] * len(texts)
     
+    async def extract_batch(indices: List[int]):
+        numbered = "\n".join(f"{n}. {texts[i]}" for n, i in enumerate(indices, start=1))
+        prompt = (
+            f"Extract one task from each of the following {len(indices)} numbered inputs:\n{numbered}\n"
+            "Return only a JSON array with one object per input, in order, each with: "
+            "index (the input number), title, description, task_type (ai/helper), urgency."
+        )
+        try:
+            response = await cached_llm_call(
+                "openai", "gpt-5.1", EXTRACT_SYSTEM_MESSAGE,
+                UserMessage(text=prompt), (prompt,), bypass_cache,
+                deadline=AI_DEADLINES["extract-tasks"],
+                cache_if=parsed_json_array
+            )
+        except Exception as e:
+            for i in indices:
+                results[i] = {"error": _error_detail(e)}
+            return
+        try:
+            items = parse_json_payload(response)
+        except ValueError:
+            items = []
+        by_number = {item.get('index'): item for item in items if isinstance(item, dict)} if isinstance(items, list) else {}
+        for n, i in enumerate(indices, start=1):
+            item = by_number.get(n)
+            if item is not None:
+                item.pop('index', None)
+                results[i] = {"task_suggestion": item}
+    
+    batches = pack_batches(texts)
+    await asyncio.gather(*(extract_batch(indices) for indices in batches))
+    
+    # Inputs the model dropped or mangled get an individual call, paced so they queue here and not at the gate
+    pace = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    
+    async def extract_single(i: int) -> dict:
+        async with pace:
+            try:
+                result = await run_task_extraction(texts[i], bypass_cache)
+            except HTTPException as e:
+                return {"error": e.detail}
+        if 'task_suggestion' not in result:
+            return result
+        # Single calls return the raw model text; batched items are already parsed
+        try:
+            suggestion = parse_json_payload(result['task_suggestion'])
+        except ValueError:
+            suggestion = None
+        return {"task_suggestion": suggestion} if isinstance(suggestion, dict) else {"error": "Model returned no task"}
+    
+    missing = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(missing, await asyncio.gather(*(extract_single(i) for i in missing))):
+        results[i] = result
+    return results, len(batches) + len(missing)
+
+async def run_document_analysis(digest: str, bypass_cache: bool = False) -> dict:
     try:
-        document_data = await file.read()
-        
-        # For text files, extract directly
-        if file.content_type == 'text/plain':
-            text = document_data.decode('utf-8')
-            return {"extracted_text": text[:1000]}  # Limit to 1000 chars
-        
-        # For other documents, use AI to extract
-        base64_doc = base64.b64encode(document_data).decode('utf-8')
-        
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=str(uuid.uuid4()),
-            system_message="You extract text and actionable items from documents."
-        ).with_model("openai", "gpt-4o")
-        
         message = UserMessage(
-            text="Extract all text and actionable items from this document."
+            text=DOCUMENT_PROMPT
         )
         
-        response = await chat.send_message(message)
+        response = await cached_llm_call(
+            "openai", "gpt-4o", DOCUMENT_SYSTEM_MESSAGE,
+            message, (DOCUMENT_PROMPT, digest), bypass_cache,
+            deadline=AI_DEADLINES["analyze-document"]
+        )
         return {"extracted_text": response}
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e), "extracted_text": ""}
 
+async def _image_job(job: dict) -> dict:
+    base64_image = base64.b64encode(job['payload']).decode('ascii')
+    return await run_image_analysis(base64_image, job['params']['digest'], job['params']['bypass_cache'])
+
+async def _extract_job(job: dict) -> dict:
+    return await run_task_extraction(job['params']['text'], job['params']['bypass_cache'])
+
+async def _document_job(job: dict) -> dict:
+    return await run_document_analysis(job['params']['digest'], job['params']['bypass_cache'])
+
+def _ai_retry_delay(error: Exception) -> Optional[float]:
+    # Busy gate, open breakers and deadlines clear up on their own; anything else is the job's fault
+    if isinstance(error, HTTPException) and error.status_code in (429, 503, 504):
+        return float((error.headers or {}).get("Retry-After", 0))
+    return None
+
+ai_job_queue = ai_jobs.JobQueue(
+    db,
+    {"analyze-image": _image_job, "extract-task": _extract_job, "analyze-document": _document_job},
+    workers=AI_JOB_WORKERS,
+    lease_seconds=AI_JOB_LEASE_SECONDS,
+    job_timeout=AI_JOB_TIMEOUT_SECONDS,
+    retry_delay=_ai_retry_delay,
+)
+
+async def submit_ai_job(kind: str, user_id: str, params: dict, payload: Optional[bytes] = None) -> JSONResponse:
+    job_id = await ai_job_queue.submit(kind, user_id, params, payload)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@api_router.post("/ai/analyze-image")
+async def analyze_image(
+    file: UploadFile = File(...),
+    token: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+    mode: str = Query("sync", pattern="^(sync|job)$"),
+):
+    user_id = await get_current_user(bearer_token(authorization) or token)
+    digest = await scan_upload(file)
+    
+    if mode == "job":
+        params = {"digest": digest, "bypass_cache": cache_bypassed(cache_control)}
+        return await submit_ai_job("analyze-image", user_id, params, await file.read())
+    base64_image = base64_from_file(file.file)
+    return await run_image_analysis(base64_image, digest, cache_bypassed(cache_control))
+
+@api_router.post("/ai/analyze-image/stream")
+async def analyze_image_stream(
+    file: UploadFile = File(...),
+    token: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+):
+    await get_current_user(bearer_token(authorization) or token)
+    digest = await scan_upload(file)
+    base64_image = base64_from_file(file.file)
+    
+    message = UserMessage(text=IMAGE_PROMPT, file_contents=[ImageContent(image_base64=base64_image)])
+    return sse_response(stream_llm_events(
+        "openai", "gpt-4o", IMAGE_SYSTEM_MESSAGE,
+        message, (IMAGE_PROMPT, digest), "analysis",
+        cache_bypassed(cache_control), AI_DEADLINES["analyze-image"]
+    ))
+
+@api_router.post("/ai/extract-task")
+async def extract_task(
+    text: str,
+    cache_control: Optional[str] = Header(None),
+    mode: str = Query("sync", pattern="^(sync|job)$"),
+    user_id: str = Depends(current_user_id),
+):
+    if mode == "job":
+        params = {"text": text, "bypass_cache": cache_bypassed(cache_control)}
+        return await submit_ai_job("extract-task", user_id, params)
+    return await run_task_extraction(text, cache_bypassed(cache_control))
+
+@api_router.post("/ai/extract-task/stream", dependencies=[Depends(current_user_id)])
+async def extract_task_stream(text: str, cache_control: Optional[str] = Header(None)):
+    prompt = extract_prompt(text)
+    return sse_response(stream_llm_events(
+        "openai", "gpt-5.1", EXTRACT_SYSTEM_MESSAGE,
+        UserMessage(text=prompt), (prompt,), "task_suggestion",
+        cache_bypassed(cache_control), AI_DEADLINES["extract-task"]
+    ))
+
+class TaskExtractionBatch(BaseModel):
+    texts: List[str] = Field(min_length=1, max_length=200)
+    create_tasks: bool = False
+
+@api_router.post("/ai/extract-tasks")
+async def extract_tasks(
+    batch: TaskExtractionBatch,
+    cache_control: Optional[str] = Header(None),
+    user_id: str = Depends(current_user_id),
+):
+    try:
+        results, model_calls = await run_batch_extraction(batch.texts, cache_bypassed(cache_control))
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"error": str(e), "results": [], "model_calls": 0}
+    
+    created_task_ids = []
+    if batch.create_tasks:
+        task_dicts = []
+        for result in results:
+            suggestion = result.get('task_suggestion')
+            if not suggestion or not suggestion.get('title'):
+                created_task_ids.append(None)
+                continue
+            task = Task(
+                title=str(suggestion['title']),
+                description=str(suggestion.get('description') or ''),
+                task_type=suggestion.get('task_type') if suggestion.get('task_type') in ('ai', 'helper') else 'ai',
+                urgency=suggestion.get('urgency') if suggestion.get('urgency') in ('low', 'medium', 'high') else 'medium',
+                estimated_cost=10.0,
+                created_by=user_id
+            )
+            task_dict = task.model_dump()
+            task_dicts.append(task_dict)
+            created_task_ids.append(task.id)
+        if task_dicts:
+            await db.tasks.insert_many(task_dicts)
+            await resources_changed(versions.tasks_key(user_id))
+            await stats.record_task_created(
+                db, user_id, 'pending', sum(t['estimated_cost'] for t in task_dicts), count=len(task_dicts)
+            )
+    
+    return {"results": results, "model_calls": model_calls, "created_task_ids": created_task_ids}
+
+@api_router.post("/ai/analyze-document")
+async def analyze_document(
+    file: UploadFile = File(...),
+    token: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+    mode: str = Query("sync", pattern="^(sync|job)$"),
+):
+    user_id = await get_current_user(bearer_token(authorization) or token)
+    digest = await scan_upload(file)
+    
+    # For text files, extract directly
+    if file.content_type == 'text/plain':
+        # 1000 chars is at most 4000 UTF-8 bytes; drop a character split at the cut
+        text = (await file.read(4000)).decode('utf-8', errors='ignore')
+        return {"extracted_text": text[:1000]}  # Limit to 1000 chars
+    
+    # For other documents, use AI to extract
+    if mode == "job":
+        params = {"digest": digest, "bypass_cache": cache_bypassed(cache_control)}
+        return await submit_ai_job("analyze-document", user_id, params)
+    return await run_document_analysis(digest, cache_bypassed(cache_control))
+
+@api_router.get("/ai/jobs/{job_id}")
+async def get_ai_job(job_id: str, user_id: str = Depends(current_user_id)):
+    job = await ai_job_queue.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/ai/jobs/{job_id}/events")
+async def stream_ai_job(job_id: str, user_id: str = Depends(current_user_id)):
+    if not await ai_job_queue.get(job_id, user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_status = None
+        while True:
+            job = await ai_job_queue.get(job_id, user_id)
+            if job is None:
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield sse_event(job['status'], job)
+            else:
+                yield ": keepalive\n\n"
+            if job['status'] in ("done", "failed"):
+                return
+            await ai_job_queue.wait_for_change(job_id, AI_JOB_POLL_SECONDS)
+    
+    return sse_response(events())
+
+# ============= INSIGHTS ROUTES =============
+# Bucket native dates with $dateToString and unmigrated ISO strings by their "YYYY-MM" prefix
+MONTH_OF_CREATED_AT = {
+    "$cond": [
+        {"$eq": [{"$type": "$created_at"}, "date"]},
+        {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+        {"$substrCP": ["$created_at", 0, 7]},
+    ]
+}
+
+def _by_month(rows: list) -> list:
+    return [{"month": row['_id'], "amount": row['amount']} for row in sorted(rows, key=lambda r: r['_id'])]
+
+@api_router.get("/insights/summary")
+async def get_insights_summary(user_id: str = Depends(current_user_id)):
+    task_pipeline = [
+        {"$match": {"created_by": user_id}},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "by_month": [{"$group": {"_id": MONTH_OF_CREATED_AT, "amount": {"$sum": {"$ifNull": ["$estimated_cost", 0]}}}}],
+        }},
+    ]
+    payment_pipeline = [
+        {"$match": {"from_user": user_id, "task_id": {"$nin": ["add_funds", "withdraw"]}}},
+        {"$group": {"_id": MONTH_OF_CREATED_AT, "amount": {"$sum": "$amount"}}},
+    ]
+    task_result, payment_rows = await asyncio.gather(
+        db.tasks.aggregate(task_pipeline).to_list(1),
+        db.transactions.aggregate(payment_pipeline).to_list(None),
+    )
+    facets = task_result[0] if task_result else {"by_status": [], "by_month": []}
+    by_status = {row['_id']: row['count'] for row in facets['by_status']}
+    spend_by_month = _by_month(facets['by_month'])
+    
+    return {
+        "tasks": {"total": sum(by_status.values()), "by_status": by_status},
+        "total_spent": sum(row['amount'] for row in spend_by_month),
+        "spend_by_month": spend_by_month,
+        "payments_sent": sum(row['amount'] for row in payment_rows),
+        "payments_by_month": _by_month(payment_rows),
+    }
+
 # ============= HELPER ROUTES =============
-@api_router.get("/helpers")
-async def get_helpers(token: str):
-    await get_current_user(token)
-    helpers = await db.users.find({"user_type": "helper"}, {"_id": 0, "password": 0}).to_list(50)
+@api_router.get("/helpers", dependencies=[Depends(current_user_id)])
+async def get_helpers(request: Request, response: Response):
+    not_modified, cache_key = await check_etag(
+        request, response, cache.HELPERS_KEY, f"private, max-age={HELPERS_MAX_AGE_SECONDS}"
+    )
+    if not_modified:
+        return not_modified
+    helpers = await read_cache.get_or_load(
+        cache_key, CACHE_TTLS["helpers"], lambda: repository.list_helpers(db)
+    )
     return helpers
 
+@api_router.get("/helpers/search", dependencies=[Depends(current_user_id)])
+async def search_helpers(
+    response: Response,
+    q: Optional[str] = Query(None, min_length=2, max_length=100),
+    mode: str = Query("prefix", pattern="^(prefix|text)$"),
+    skill: Optional[str] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    kyc_status: Optional[str] = None,
+    sort: str = Query("rating", pattern="^(rating|recent)$"),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+):
+    query = helper_search.build_query(q, mode, skill, min_rating, kyc_status)
+    try:
+        helpers, next_cursor = await helper_search.search(db, query, sort, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return fast_response(helpers, response=response)
+
 @api_router.post("/helpers/accept-task")
-async def accept_task(task_id: str, token: str):
-    helper_id = await get_current_user(token)
-    
-    result = await db.tasks.update_one(
+async def accept_task(task_id: str, helper_id: str = Depends(current_user_id)):
+    previous = await db.tasks.find_one_and_update(
         {"id": task_id, "status": "pending"},
-        {"$set": {"assigned_to": helper_id, "status": "in_progress"}}
+        {"$set": {"assigned_to": helper_id, "status": "in_progress"}},
+        projection={"_id": 0, "created_by": 1, "title": 1}
     )
     
-    if result.modified_count == 0:
+    if not previous:
         raise HTTPException(status_code=400, detail="Task not available")
     
+    await stats.record_task_status_change(db, previous['created_by'], "pending", "in_progress")
+    await db.users.update_one({"id": helper_id}, {"$set": {"last_active_at": datetime.now(timezone.utc)}})
+    await resources_changed(versions.tasks_key(previous['created_by']), cache.profile_key(helper_id))
+    for party in {previous['created_by'], helper_id}:
+        publish(party, "task_status", {"task_id": task_id, "status": "in_progress"})
+    await notify(previous['created_by'], f"A helper accepted your task \"{previous['title']}\"", task_id=task_id)
     return {"success": True}
 
 # ============= PAYMENT ROUTES =============
 class PaymentRequest(BaseModel):
-    amount: float
+    amount: float = Field(gt=0)
     recipient_email: Optional[str] = None
 
 @api_router.post("/payments/add-funds")
-async def add_funds(payment: PaymentRequest, token: str):
-    user_id = await get_current_user(token)
-    
-    # Update user wallet balance
-    result = await db.users.update_one(
-        {"id": user_id},
-        {"$inc": {"wallet_balance": payment.amount}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Create transaction record
+async def add_funds(payment: PaymentRequest, user_id: str = Depends(current_user_id)):
     transaction = Transaction(
         task_id="add_funds",
         from_user=user_id,
@@ -380,30 +1321,18 @@ async def add_funds(payment: PaymentRequest, token: str):
     )
     
     trans_dict = transaction.model_dump()
-    trans_dict['created_at'] = trans_dict['created_at'].isoformat()
-    await db.transactions.insert_one(trans_dict)
+    
+    # Balance, ledger entry and transaction record commit together
+    if not await wallet.deposit(db, user_id, payment.amount, trans_dict):
+        raise HTTPException(status_code=404, detail="User not found")
+    await resources_changed(*cache.user_keys(user_id))
+    await stats.record_payment(db, user_id, transaction.task_id, payment.amount)
+    await publish_balance(user_id)
     
     return {"success": True, "message": "Funds added successfully"}
 
 @api_router.post("/payments/withdraw")
-async def withdraw_funds(payment: PaymentRequest, token: str):
-    user_id = await get_current_user(token)
-    
-    # Check balance
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user or user.get('wallet_balance', 0) < payment.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
-    
-    # Update user wallet balance
-    result = await db.users.update_one(
-        {"id": user_id},
-        {"$inc": {"wallet_balance": -payment.amount}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Create transaction record
+async def withdraw_funds(payment: PaymentRequest, user_id: str = Depends(current_user_id)):
     transaction = Transaction(
         task_id="withdraw",
         from_user=user_id,
@@ -412,57 +1341,63 @@ async def withdraw_funds(payment: PaymentRequest, token: str):
     )
     
     trans_dict = transaction.model_dump()
-    trans_dict['created_at'] = trans_dict['created_at'].isoformat()
-    await db.transactions.insert_one(trans_dict)
+    
+    # Guarded debit, ledger entry and transaction record commit together
+    if not await wallet.withdraw(db, user_id, payment.amount, trans_dict):
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+    await resources_changed(*cache.user_keys(user_id))
+    await stats.record_payment(db, user_id, transaction.task_id, payment.amount)
+    await publish_balance(user_id)
     
     return {"success": True, "message": "Withdrawal initiated successfully"}
 
 @api_router.post("/payments/send")
-async def send_money(payment: PaymentRequest, token: str):
-    user_id = await get_current_user(token)
-    
+async def send_money(payment: PaymentRequest, user_id: str = Depends(current_user_id)):
     if not payment.recipient_email:
         raise HTTPException(status_code=400, detail="Recipient email required")
     
-    # Check balance
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user or user.get('wallet_balance', 0) < payment.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
-    
     # Find recipient
-    recipient = await db.users.find_one({"email": payment.recipient_email}, {"_id": 0})
-    if not recipient:
+    recipient_id = await repository.find_user_id_by_email(db, payment.recipient_email)
+    if not recipient_id:
         raise HTTPException(status_code=404, detail="Recipient not found")
     
-    # Transfer funds
-    await db.users.update_one(
-        {"id": user_id},
-        {"$inc": {"wallet_balance": -payment.amount}}
-    )
-    await db.users.update_one(
-        {"id": recipient['id']},
-        {"$inc": {"wallet_balance": payment.amount}}
-    )
-    
-    # Create transaction record
     transaction = Transaction(
         task_id="send_money",
         from_user=user_id,
-        to_user=recipient['id'],
+        to_user=recipient_id,
         amount=payment.amount,
         status='completed'
     )
     
     trans_dict = transaction.model_dump()
-    trans_dict['created_at'] = trans_dict['created_at'].isoformat()
-    await db.transactions.insert_one(trans_dict)
+    
+    # Debit, credit, ledger entries and transaction record commit together
+    try:
+        transferred = await wallet.transfer(db, user_id, recipient_id, payment.amount, trans_dict)
+    except wallet.RecipientNotFound:
+        # Deleted since the lookup above; the debit was rolled back
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    if not transferred:
+        raise HTTPException(status_code=400, detail="Insufficient balance")
+    await resources_changed(*cache.user_keys(user_id, recipient_id))
+    await stats.record_payment(db, user_id, transaction.task_id, payment.amount, to_user=recipient_id)
+    await notify(recipient_id, f"You received ${payment.amount:.2f}")
+    await publish_balance(user_id, recipient_id)
     
     return {"success": True, "message": "Money sent successfully"}
 
+@api_router.get("/payments/statement")
+async def get_statement(
+    limit: int = Query(50, ge=1, le=500),
+    before_seq: Optional[int] = None,
+    user_id: str = Depends(current_user_id),
+):
+    balance, seq = await ledger.get_balance(db, user_id)
+    statement = await ledger.get_statement(db, user_id, limit, before_seq)
+    return {"balance": balance, "seq": seq, **statement}
+
 @api_router.post("/payments/escrow")
-async def create_escrow(task_id: str, amount: float, token: str):
-    user_id = await get_current_user(token)
-    
+async def create_escrow(task_id: str, amount: float, user_id: str = Depends(current_user_id)):
     transaction = Transaction(
         task_id=task_id,
         from_user=user_id,
@@ -471,15 +1406,13 @@ async def create_escrow(task_id: str, amount: float, token: str):
     )
     
     trans_dict = transaction.model_dump()
-    trans_dict['created_at'] = trans_dict['created_at'].isoformat()
     
     await db.transactions.insert_one(trans_dict)
+    await stats.record_payment(db, user_id, transaction.task_id, amount)
     return transaction
 
-@api_router.post("/payments/release")
-async def release_payment(transaction_id: str, token: str):
-    await get_current_user(token)
-    
+@api_router.post("/payments/release", dependencies=[Depends(current_user_id)])
+async def release_payment(transaction_id: str):
     result = await db.transactions.update_one(
         {"id": transaction_id},
         {"$set": {"status": "completed"}}
@@ -491,75 +1424,162 @@ async def release_payment(transaction_id: str, token: str):
     return {"success": True}
 
 @api_router.get("/payments/transactions")
-async def get_transactions(token: str):
-    user_id = await get_current_user(token)
-    transactions = await db.transactions.find({"from_user": user_id}, {"_id": 0}).to_list(100)
-    return transactions
+async def get_transactions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user_id: str = Depends(current_user_id),
+):
+    transactions = await paginate(db.transactions, {"from_user": user_id}, limit, after, response)
+    return fast_response(transactions, List[Transaction], response)
 
 # ============= AUTOMATION ROUTES =============
+async def run_automation(automation: dict):
+    await notify(automation['user_id'], f"Your {automation['automation_type'].replace('_', ' ')} automation ran")
+
+async def automation_fired(automation: dict):
+    # last_run and next_run_at changed
+    await resources_changed(versions.automations_key(automation['user_id']))
+
+automation_scheduler = scheduler.Scheduler(
+    db,
+    run_automation,
+    batch_size=SCHEDULER_BATCH_SIZE,
+    concurrency=SCHEDULER_CONCURRENCY,
+    lease_seconds=SCHEDULER_LEASE_SECONDS,
+    tick_seconds=SCHEDULER_TICK_SECONDS,
+    after_fire=automation_fired,
+)
+
 @api_router.post("/automations", response_model=Automation)
-async def create_automation(automation_type: str, schedule: str, token: str):
-    user_id = await get_current_user(token)
-    
+async def create_automation(automation_type: str, schedule: str, user_id: str = Depends(current_user_id)):
     automation = Automation(
         user_id=user_id,
         automation_type=automation_type,
         schedule=schedule
     )
+    try:
+        automation.next_run_at = scheduler.next_run(schedule, automation.created_at)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     auto_dict = automation.model_dump()
-    auto_dict['created_at'] = auto_dict['created_at'].isoformat()
     
     await db.automations.insert_one(auto_dict)
+    await resources_changed(versions.automations_key(user_id))
     return automation
 
 @api_router.get("/automations")
-async def get_automations(token: str):
-    user_id = await get_current_user(token)
-    automations = await db.automations.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    return automations
+async def get_automations(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user_id: str = Depends(current_user_id),
+):
+    not_modified, _ = await check_etag(request, response, versions.automations_key(user_id))
+    if not_modified:
+        return not_modified
+    automations = await paginate(db.automations, {"user_id": user_id}, limit, after, response)
+    return fast_response(automations, List[Automation], response)
 
 @api_router.patch("/automations/{auto_id}/toggle")
-async def toggle_automation(auto_id: str, token: str):
-    user_id = await get_current_user(token)
-    
-    automation = await db.automations.find_one({"id": auto_id, "user_id": user_id})
+async def toggle_automation(auto_id: str, user_id: str = Depends(current_user_id)):
+    automation = await repository.find_automation_for_toggle(db, auto_id, user_id)
     if not automation:
         raise HTTPException(status_code=404, detail="Automation not found")
     
     new_status = not automation.get('active', True)
-    await db.automations.update_one({"id": auto_id}, {"$set": {"active": new_status}})
+    update = {"active": new_status}
+    if new_status:
+        # Resume from now rather than firing every slot missed while paused
+        try:
+            update["next_run_at"] = scheduler.next_run(automation['schedule'], datetime.now(timezone.utc))
+        except ValueError:
+            update["next_run_at"] = None
+    await db.automations.update_one({"id": auto_id}, {"$set": update})
+    await resources_changed(versions.automations_key(user_id))
     
     return {"active": new_status}
 
 @api_router.delete("/automations/{auto_id}")
-async def delete_automation(auto_id: str, token: str):
-    user_id = await get_current_user(token)
-    
+async def delete_automation(auto_id: str, user_id: str = Depends(current_user_id)):
     result = await db.automations.delete_one({"id": auto_id, "user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Automation not found")
+    await resources_changed(versions.automations_key(user_id))
     
     return {"success": True}
 
 # ============= NOTIFICATION ROUTES =============
 @api_router.get("/notifications")
-async def get_notifications(token: str):
-    user_id = await get_current_user(token)
-    notifications = await db.notifications.find({"user_id": user_id}, {"_id": 0}).sort("created_at", -1).to_list(50)
-    return notifications
+async def get_notifications(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None,
+    user_id: str = Depends(current_user_id),
+):
+    notifications = await paginate(db.notifications, {"user_id": user_id}, limit, after, response)
+    return fast_response(notifications, List[Notification], response)
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_count(user_id: str = Depends(current_user_id)):
+    return {"unread": await notifications.unread_count(db, user_id)}
+
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=1000)
+    before: Optional[str] = None  # X-Next-Cursor value; marks that notification and everything older
+
+@api_router.post("/notifications/read")
+async def mark_many_read(request: MarkReadRequest, user_id: str = Depends(current_user_id)):
+    if request.ids is not None:
+        query = {"id": {"$in": request.ids}}
+    elif request.before is not None:
+        query = created_before(request.before, inclusive=True)
+    else:
+        raise HTTPException(status_code=400, detail="Pass ids or before")
+    
+    updated = await notifications.mark_read(db, user_id, query)
+    return {"updated": updated}
 
 @api_router.patch("/notifications/{notif_id}/read")
-async def mark_read(notif_id: str, token: str):
-    await get_current_user(token)
-    await db.notifications.update_one({"id": notif_id}, {"$set": {"read": True}})
+async def mark_read(notif_id: str, user_id: str = Depends(current_user_id)):
+    if not await notifications.mark_one_read(db, user_id, notif_id):
+        raise HTTPException(status_code=404, detail="Notification not found")
     return {"success": True}
 
+# ============= PUSH STREAM ROUTES =============
+@api_router.get("/stream")
+async def stream_events(user_id: str = Depends(current_user_id)):
+    """Server-Sent Events for the caller: ``task_status``, ``notification`` and ``balance``.
+
+    A connection that falls too far behind gets an ``error`` event and is closed;
+    the client should reconnect and refetch.
+    """
+    subscription = event_bus.subscribe(user_id)
+    
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await subscription.next(STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    yield sse_event("error", {"detail": "Event stream fell behind; reconnect and refetch"})
+                    return
+                yield sse_event(event['event'], event['data'])
+        finally:
+            event_bus.unsubscribe(user_id, subscription)
+    
+    return sse_response(events())
+
 # ============= DISPUTE ROUTES =============
 @api_router.post("/disputes", response_model=Dispute)
-async def create_dispute(task_id: str, helper_id: str, reason: str, token: str):
-    user_id = await get_current_user(token)
-    
+async def create_dispute(task_id: str, helper_id: str, reason: str, user_id: str = Depends(current_user_id)):
     dispute = Dispute(
         task_id=task_id,
         user_id=user_id,
@@ -568,26 +1588,78 @@ async def create_dispute(task_id: str, helper_id: str, reason: str, token: str):
     )
     
     dispute_dict = dispute.model_dump()
-    dispute_dict['created_at'] = dispute_dict['created_at'].isoformat()
     
     await db.disputes.insert_one(dispute_dict)
     return dispute
 
 @api_router.get("/disputes")
-async def get_disputes(token: str):
-    user_id = await get_current_user(token)
-    disputes = await db.disputes.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    return disputes
+async def get_disputes(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user_id: str = Depends(current_user_id),
+):
+    disputes = await paginate(db.disputes, {"user_id": user_id}, limit, after, response)
+    return fast_response(disputes, List[Dispute], response)
+
+# ============= METRICS ROUTES =============
+@api_router.get("/metrics", dependencies=[Depends(current_user_id)])
+async def get_metrics():
+    return {
+        "auth_cache": token_cache.stats(),
+        "uploads": upload_stats,
+        "llm_cache": llm_cache.stats(),
+        "llm_gate": llm_gate.stats(),
+        "llm_inflight": llm_inflight.stats(),
+        "llm_clients": llm_clients.stats(),
+        "llm_breakers": llm_breakers.stats(),
+        "llm_latency": llm_latency.stats(),
+        "llm_hedges_sent": llm_hedges_sent,
+        "ai_jobs": ai_job_queue.stats(),
+        "scheduler": automation_scheduler.stats(),
+        "notifications": notification_writer.stats(),
+        "push": event_bus.stats(),
+        "queries": repository.query_accounting.stats(),
+        "read_cache": read_cache.stats(),
+        "etags": etag_stats,
+    }
 
 # ============= INCLUDE ROUTER =============
 app.include_router(api_router)
 
+@app.middleware("http")
+async def account_queries(request, call_next):
+    token = repository.query_accounting.start_request()
+    if token is None:
+        return await call_next(request)
+    route = None
+    try:
+        response = await call_next(request)
+        route = request.scope.get('route')
+    finally:
+        key = f"{request.method} {route.path if route else request.url.path}"
+        queries = repository.query_accounting.finish_request(token, key)
+    response.headers['X-DB-Queries'] = str(queries.round_trips)
+    response.headers['X-DB-Bytes'] = str(queries.bytes_returned)
+    return response
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    # Reject oversized uploads from Content-Length before the multipart body is parsed
+    if request.url.path in UPLOAD_PATHS:
+        length = request.headers.get('content-length', '')
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            upload_stats['rejected'] += 1
+            return JSONResponse(status_code=413, content={"detail": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Queries", "X-DB-Bytes", "ETag"],
 )
 
 logging.basicConfig(
@@ -596,6 +1668,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def backfill_helper_search():
+    if await helper_search.backfill(db):
+        await resources_changed(cache.HELPERS_KEY)
+
+@app.on_event("startup")
+async def start_ai_jobs():
+    await ai_job_queue.start()
+
+@app.on_event("startup")
+async def start_notification_writer():
+    await notification_writer.start()
+
+change_stream_watcher: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_change_streams():
+    global change_stream_watcher
+    if STREAM_CHANGE_STREAMS:
+        change_stream_watcher = asyncio.create_task(push.watch_changes(db, event_bus))
+
+@app.on_event("startup")
+async def start_scheduler():
+    if SCHEDULER_ENABLED:
+        await automation_scheduler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await ai_job_queue.stop()
+    await automation_scheduler.stop()
+    await notification_writer.stop()
+    if change_stream_watcher:
+        change_stream_watcher.cancel()
+    await llm_clients.close()
+    await read_cache.close()
+    client.close()
+    password_executor.shutdown(wait=False)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""Incrementally maintained per-user counters in the ``user_stats`` collection.
+
+Write routes call the ``record_*`` helpers, which apply a single upserting
+``$inc`` so a dashboard can read one small document instead of re-aggregating
+history. ``reconcile_user_stats`` rebuilds the counters from the source
+collections in batches and reports any drift it corrects.
+"""
+import logging
+import sys
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Transaction.task_id markers used by the payment routes
+PAYMENT_KINDS = {
+    "add_funds": "funds_added",
+    "withdraw": "withdrawn",
+    "send_money": "sent",
+}
+
+
+async def _inc(db, user_id: str, fields: Dict[str, float]) -> None:
+    await db.user_stats.update_one({"user_id": user_id}, {"$inc": fields}, upsert=True)
+
+
+async def record_task_created(db, user_id: str, status: str, cost: Optional[float], count: int = 1) -> None:
+    """``cost`` is the combined estimated cost of the ``count`` new tasks."""
+    await _inc(db, user_id, {
+        "tasks_total": count,
+        f"tasks_by_status.{status}": count,
+        "estimated_spend": cost or 0.0,
+    })
+
+
+async def record_task_status_change(db, user_id: str, old_status: str, new_status: str) -> None:
+    if old_status == new_status:
+        return
+    await _inc(db, user_id, {
+        f"tasks_by_status.{old_status}": -1,
+        f"tasks_by_status.{new_status}": 1,
+    })
+
+
+async def record_payment(db, user_id: str, kind: str, amount: float, to_user: Optional[str] = None) -> None:
+    """kind is a Transaction.task_id marker; anything else counts as escrow."""
+    await _inc(db, user_id, {PAYMENT_KINDS.get(kind, "escrowed"): amount})
+    if to_user:
+        await _inc(db, to_user, {"received": amount})
+
+
+async def forget_user(db, user_id: str) -> None:
+    """Drop a deleted user's counters and take their payments out of their recipients' ``received``.
+
+    Call it before the user's transactions are deleted. Payments *to* the user
+    are left in the senders' ``sent`` totals: those transaction rows are kept,
+    and ``reconcile_user_stats`` counts them too.
+    """
+    async for row in db.transactions.aggregate([
+        {"$match": {"from_user": user_id, "to_user": {"$nin": [None, user_id]}}},
+        {"$group": {"_id": "$to_user", "amount": {"$sum": "$amount"}}},
+    ]):
+        await _inc(db, row['_id'], {"received": -row['amount']})
+    await db.user_stats.delete_one({"user_id": user_id})
+
+
+async def get_user_stats(db, user_id: str) -> dict:
+    stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    return stats or {"user_id": user_id}
+
+
+async def _compute_stats(db, user_ids: List[str]) -> Dict[str, dict]:
+    computed = {user_id: {"user_id": user_id} for user_id in user_ids}
+
+    task_rows = db.tasks.aggregate([
+        {"$match": {"created_by": {"$in": user_ids}}},
+        {"$group": {
+            "_id": {"user": "$created_by", "status": "$status"},
+            "count": {"$sum": 1},
+            "spend": {"$sum": {"$ifNull": ["$estimated_cost", 0]}},
+        }},
+    ])
+    async for row in task_rows:
+        stats = computed[row['_id']['user']]
+        stats['tasks_total'] = stats.get('tasks_total', 0) + row['count']
+        stats.setdefault('tasks_by_status', {})[row['_id']['status']] = row['count']
+        stats['estimated_spend'] = stats.get('estimated_spend', 0.0) + row['spend']
+
+    sent_rows = db.transactions.aggregate([
+        {"$match": {"from_user": {"$in": user_ids}}},
+        {"$group": {"_id": {"user": "$from_user", "kind": "$task_id"}, "amount": {"$sum": "$amount"}}},
+    ])
+    async for row in sent_rows:
+        stats = computed[row['_id']['user']]
+        field = PAYMENT_KINDS.get(row['_id']['kind'], "escrowed")
+        stats[field] = stats.get(field, 0.0) + row['amount']
+
+    received_rows = db.transactions.aggregate([
+        {"$match": {"to_user": {"$in": user_ids}}},
+        {"$group": {"_id": "$to_user", "amount": {"$sum": "$amount"}}},
+    ])
+    async for row in received_rows:
+        computed[row['_id']]['received'] = row['amount']
+
+    return computed
+
+
+def _normalize(stats: dict) -> dict:
+    # Counters that were decremented back to zero are equivalent to missing ones
+    normalized = {
+        k: round(v, 2) for k, v in stats.items()
+        if k not in ("user_id", "tasks_by_status", "_id") and round(v, 2) != 0
+    }
+    by_status = {k: v for k, v in stats.get('tasks_by_status', {}).items() if v != 0}
+    if by_status:
+        normalized['tasks_by_status'] = by_status
+    return normalized
+
+
+async def reconcile_user_stats(db, batch_size: int = 500) -> dict:
+    """Rebuild user_stats from tasks/transactions in id-ordered batches; return a drift report."""
+    report = {"users_checked": 0, "users_drifted": 0, "drifted_user_ids": []}
+    last_id = ""
+    while True:
+        users = await db.users.find(
+            {"id": {"$gt": last_id}}, {"_id": 0, "id": 1}
+        ).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        user_ids = [user['id'] for user in users]
+        last_id = user_ids[-1]
+
+        computed = await _compute_stats(db, user_ids)
+        stored = {
+            doc['user_id']: doc
+            async for doc in db.user_stats.find({"user_id": {"$in": user_ids}}, {"_id": 0})
+        }
+        for user_id, stats in computed.items():
+            report['users_checked'] += 1
+            if _normalize(stats) == _normalize(stored.get(user_id, {"user_id": user_id})):
+                continue
+            report['users_drifted'] += 1
+            report['drifted_user_ids'].append(user_id)
+            logger.warning(f"user_stats drift for {user_id}: stored={stored.get(user_id)} computed={stats}")
+            await db.user_stats.replace_one({"user_id": user_id}, stats, upsert=True)
+    return report
+
+
+async def _main() -> int:
+    from ops import connect
+
+    async with connect() as db:
+        report = await reconcile_user_stats(db)
+    print(f"Checked {report['users_checked']} users, fixed drift on {report['users_drifted']}")
+    return 0
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_main()))
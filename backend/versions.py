@@ -0,0 +1,132 @@
+"""Per-resource version counters behind the read routes' ETags.
+
+Every cacheable resource has a counter in ``resource_versions``, keyed like
+the read cache (``tasks:<user>``, ``profile:<user>``, ``helpers``, ...). Write
+routes ``bump`` the counters of what they changed, after the write. A read
+route looks up its counter *before* running its query, so the ETag it sends
+is never newer than the body: a write landing in between makes the next
+request miss, never serve stale data.
+
+A conditional GET whose ``If-None-Match`` matches costs this one
+single-document lookup and no query or serialization. Counters live in
+MongoDB rather than in process so every worker agrees on them.
+
+Run this module directly to compare full and conditional repeat loads of a
+task list.
+"""
+import hashlib
+import sys
+from typing import Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+
+def tasks_key(user_id: str) -> str:
+    return f"tasks:{user_id}"
+
+
+def automations_key(user_id: str) -> str:
+    return f"automations:{user_id}"
+
+
+async def bump(db, *keys: str) -> None:
+    if keys:
+        await db.resource_versions.bulk_write([
+            UpdateOne({"_id": key}, {"$inc": {"v": 1}}, upsert=True) for key in dict.fromkeys(keys)
+        ], ordered=False)
+
+
+async def current(db, key: str) -> int:
+    doc = await db.resource_versions.find_one({"_id": key}, {"_id": 0, "v": 1})
+    return doc['v'] if doc else 0
+
+
+def etag(key: str, version: int, params: Iterable[Tuple[str, str]] = ()) -> str:
+    """Weak ETag for one version of ``key`` as shaped by the query ``params`` (limit, cursor...)."""
+    digest = hashlib.sha256(f"{key}:{version}".encode('utf-8'))
+    for name, value in sorted(params):
+        if name != 'token':  # the same user's token changes on every login
+            digest.update(f"&{name}={value}".encode('utf-8'))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison of ``tag`` against an If-None-Match header (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    opaque = tag.removeprefix('W/')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == opaque:
+            return True
+    return False
+
+
+async def _measure(db, tasks: int = 100, loads: int = 200) -> dict:
+    """Seed one user's task list and time ``loads`` full and conditional repeat loads."""
+    import time
+    import uuid
+    from datetime import datetime, timezone
+
+    import fastjson
+
+    user_id = str(uuid.uuid4())
+    await db.tasks.insert_many([{
+        "id": str(uuid.uuid4()),
+        "title": f"Task {i}",
+        "description": "Pick up groceries and drop them at the front desk " * 2,
+        "task_type": "helper",
+        "status": "pending",
+        "created_by": user_id,
+        "assigned_to": None,
+        "urgency": "medium",
+        "estimated_cost": 10.0 + i,
+        "proof_urls": [],
+        "created_at": datetime.now(timezone.utc),
+    } for i in range(tasks)])
+    key = tasks_key(user_id)
+    await bump(db, key)
+    params = [("limit", str(tasks))]
+
+    async def full_load() -> int:
+        tag = etag(key, await current(db, key), params)
+        docs = await db.tasks.find({"created_by": user_id}, {"_id": 0}).sort("created_at", -1).to_list(tasks)
+        return len(fastjson.dumps(docs)) + len(tag)
+
+    async def conditional_load(known: str) -> int:
+        tag = etag(key, await current(db, key), params)
+        assert matches(known, tag)
+        return 0  # 304: headers only
+
+    known = etag(key, await current(db, key), params)
+    results = {}
+    for name, load in (("full", full_load), ("conditional", lambda: conditional_load(known))):
+        cpu, wall, sent = time.process_time(), time.perf_counter(), 0
+        for _ in range(loads):
+            sent += await load()
+        results[name] = {
+            "cpu_ms": (time.process_time() - cpu) * 1000 / loads,
+            "wall_ms": (time.perf_counter() - wall) * 1000 / loads,
+            "body_bytes": sent / loads,
+        }
+    await db.tasks.delete_many({"created_by": user_id})
+    await db.resource_versions.delete_one({"_id": key})
+    return results
+
+
+async def _bench(tasks: int = 100, loads: int = 200) -> int:
+    from ops import connect
+
+    async with connect('etag_bench', scratch=True) as db:
+        results = await _measure(db, tasks, loads)
+    full, conditional = results['full'], results['conditional']
+    for name, row in results.items():
+        print(f"{name:>11}: {row['cpu_ms']:7.3f} ms CPU, {row['wall_ms']:7.3f} ms wall, {row['body_bytes']:8.0f} body bytes per load")
+    print(f"saved per repeat load: {full['body_bytes'] - conditional['body_bytes']:.0f} bytes, "
+          f"{full['cpu_ms'] / max(conditional['cpu_ms'], 1e-6):.1f}x less CPU")
+    return 0
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100)))
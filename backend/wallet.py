@@ -0,0 +1,259 @@
+"""Wallet balance mutations.
+
+Debits are guarded in the filter (``wallet_balance >= amount``) so the balance
+check and the ``$inc`` happen in one round trip and can never overdraw under
+concurrency. Deposits, withdrawals and transfers change the balances, append
+the ledger entries and insert the transaction row inside one multi-document
+transaction when the deployment supports it. ``with_transaction`` retries the
+whole operation when two transactions touch the same wallet or ledger account
+at once (WriteConflict / TransientTransactionError), so concurrent withdrawals
+and transfers queue up instead of failing.
+"""
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import OperationFailure
+
+import ledger
+
+logger = logging.getLogger(__name__)
+
+# Standalone mongod (e.g. local dev) cannot run multi-document transactions
+_transactions_supported: Optional[bool] = None
+
+OPENING_MIGRATION = "ledger_opening_balances"
+
+
+class RecipientNotFound(Exception):
+    """The transfer's recipient no longer exists; nothing was moved."""
+
+
+async def credit(db, user_id: str, amount: float, session=None) -> bool:
+    result = await db.users.update_one(
+        {"id": user_id},
+        {"$inc": {"wallet_balance": amount}},
+        session=session
+    )
+    return result.modified_count == 1
+
+
+async def debit(db, user_id: str, amount: float, session=None) -> bool:
+    """Return False when the user does not exist or cannot cover ``amount``."""
+    result = await db.users.update_one(
+        {"id": user_id, "wallet_balance": {"$gte": amount}},
+        {"$inc": {"wallet_balance": -amount}},
+        session=session
+    )
+    return result.modified_count == 1
+
+
+async def _atomically(db, operation) -> bool:
+    """Run ``operation(session)`` in a transaction, or with session=None where unsupported."""
+    global _transactions_supported
+    if _transactions_supported is not False:
+
+        async def attempt(session):
+            result = await operation(session)
+            if not result:
+                # Nothing to commit (e.g. insufficient funds); with_transaction returns as-is
+                await session.abort_transaction()
+            return result
+
+        try:
+            async with await db.client.start_session() as session:
+                result = await session.with_transaction(attempt)
+            _transactions_supported = True
+            return result
+        except OperationFailure as e:
+            # IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+            if e.code != 20:
+                raise
+            logger.warning("MongoDB transactions unavailable; falling back to compensating writes")
+            _transactions_supported = False
+    return await operation(None)
+
+
+async def _refund_on_error(db, user_id: str, amount: float, session, write):
+    try:
+        await write()
+    except Exception:
+        if session is None:
+            # No transaction to roll back; put the debited money back
+            logger.exception(f"Wallet write failed after debit; refunding {user_id}")
+            await credit(db, user_id, amount)
+        raise
+
+
+async def deposit(db, user_id: str, amount: float, ledger_row: dict) -> bool:
+    """Credit ``amount`` and record it; False if the user does not exist."""
+    async def operation(session):
+        if not await credit(db, user_id, amount, session=session):
+            return False
+        await ledger.record_deposit(db, user_id, amount, ledger_row['id'], session=session)
+        await db.transactions.insert_one(ledger_row, session=session)
+        return True
+    return await _atomically(db, operation)
+
+
+async def withdraw(db, user_id: str, amount: float, ledger_row: dict) -> bool:
+    """Debit ``amount`` and record it; False if funds are insufficient."""
+    async def operation(session):
+        if not await debit(db, user_id, amount, session=session):
+            return False
+
+        async def write():
+            await ledger.record_withdrawal(db, user_id, amount, ledger_row['id'], session=session)
+            await db.transactions.insert_one(ledger_row, session=session)
+        await _refund_on_error(db, user_id, amount, session, write)
+        return True
+    return await _atomically(db, operation)
+
+
+async def transfer(db, from_user: str, to_user: str, amount: float, ledger_row: dict) -> bool:
+    """Move ``amount`` between wallets and record it; False if funds are insufficient.
+
+    Raises RecipientNotFound, with the debit rolled back, when ``to_user`` is gone.
+    """
+    async def operation(session):
+        if not await debit(db, from_user, amount, session=session):
+            return False
+
+        async def write():
+            if not await credit(db, to_user, amount, session=session):
+                raise RecipientNotFound(to_user)
+            await ledger.record_transfer(db, from_user, to_user, amount, ledger_row['id'], session=session)
+            await db.transactions.insert_one(ledger_row, session=session)
+        await _refund_on_error(db, from_user, amount, session, write)
+        return True
+    return await _atomically(db, operation)
+
+
+async def close(db, user_id: str) -> float:
+    """Zero the wallet and close its ledger account before the user is deleted; returns the payout."""
+    payout = 0.0
+
+    async def operation(session):
+        nonlocal payout
+        user = await db.users.find_one_and_update(
+            {"id": user_id}, {"$set": {"wallet_balance": 0.0}},
+            projection={"_id": 0, "wallet_balance": 1}, session=session
+        )
+        payout = user.get('wallet_balance', 0.0) if user else 0.0
+        await ledger.record_closure(db, user_id, payout, session=session)
+        return True
+    await _atomically(db, operation)
+    return payout
+
+
+async def open_ledger_accounts(db) -> int:
+    """One-off: give every wallet funded before the ledger existed its opening-balance entry.
+
+    Each user is flagged with ``ledger_opened_at`` in the same transaction that
+    reads its balance, so concurrent deposits and debits conflict and retry
+    instead of being counted twice, and a rerun skips users already opened.
+    Without transactions (standalone mongod) run it while payments are paused.
+    Returns the number of wallets that needed an opening entry.
+    """
+    done = await db.migrations.find_one({"_id": OPENING_MIGRATION}, {"_id": 0, "done": 1})
+    if done and done.get('done'):
+        return 0
+    opened = 0
+    async for user in db.users.find({"ledger_opened_at": {"$exists": False}}, {"_id": 0, "id": 1}):
+        amount = 0.0
+
+        async def operation(session):
+            nonlocal amount
+            doc = await db.users.find_one_and_update(
+                {"id": user['id'], "ledger_opened_at": {"$exists": False}},
+                {"$set": {"ledger_opened_at": datetime.now(timezone.utc)}},
+                projection={"_id": 0, "wallet_balance": 1}, session=session
+            )
+            if doc is not None:
+                amount = await ledger.record_opening(db, user['id'], doc.get('wallet_balance', 0.0), session=session)
+            return True
+        await _atomically(db, operation)
+        opened += bool(amount)
+    await db.migrations.update_one(
+        {"_id": OPENING_MIGRATION},
+        {"$set": {"done": True, "opened": opened, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return opened
+
+
+async def _bench(concurrency: int = 200, operations: int = 5000) -> int:
+    """Hammer the withdraw and transfer paths on shared wallets and check every final balance."""
+    from ops import connect
+
+    # Scratch database: the bench's deposits and withdrawals also post to the shared external:* accounts
+    async with connect('wallet_bench', scratch=True) as db:
+        return await _hammer(db, concurrency, operations)
+
+
+async def _hammer(db, concurrency: int, operations: int) -> int:
+    import asyncio
+
+    run = uuid.uuid4().hex[:8]
+    spender, alice, bob = (f"wallet-bench-{run}-{name}" for name in ("spender", "alice", "bob"))
+    funded = {spender: float(operations // 2), alice: float(operations), bob: float(operations)}
+    gate = asyncio.Semaphore(concurrency)
+
+    def row(kind: str) -> dict:
+        return {"id": str(uuid.uuid4()), "task_id": kind, "amount": 1.0, "status": "completed"}
+
+    async def limited(call):
+        async with gate:
+            return await call
+
+    await db.users.insert_many([
+        {"id": user_id, "email": f"{user_id}@bench.local", "wallet_balance": 0.0} for user_id in funded
+    ])
+    for user_id, amount in funded.items():
+        await deposit(db, user_id, amount, row("add_funds"))
+
+    # Twice as many withdrawals as the spender can cover, all on one document
+    started = time.perf_counter()
+    withdrawals = await asyncio.gather(*(
+        limited(withdraw(db, spender, 1.0, row("withdraw"))) for _ in range(operations)
+    ))
+    withdraw_seconds = time.perf_counter() - started
+
+    # Transfers in both directions contend on both wallets and both ledger accounts
+    started = time.perf_counter()
+    transfers = await asyncio.gather(*(
+        limited(transfer(db, *((alice, bob) if i % 2 else (bob, alice)), 1.0, row("send_money")))
+        for i in range(operations)
+    ))
+    transfer_seconds = time.perf_counter() - started
+
+    balances = {
+        doc['id']: doc['wallet_balance']
+        async for doc in db.users.find({"id": {"$in": list(funded)}}, {"_id": 0, "id": 1, "wallet_balance": 1})
+    }
+    ledger_balances = {user_id: (await ledger.get_balance(db, user_id))[0] for user_id in funded}
+    problems = await ledger.verify(db)
+
+    mode = "transactions" if _transactions_supported else "compensating writes (no replica set)"
+    print(f"mode: {mode}")
+    print(f"{operations} withdrawals in {withdraw_seconds:.2f}s ({operations / withdraw_seconds:.0f}/s), "
+          f"{sum(withdrawals)} succeeded, final balance {balances[spender]}")
+    print(f"{operations} transfers in {transfer_seconds:.2f}s ({operations / transfer_seconds:.0f}/s), "
+          f"{sum(transfers)} succeeded, balances {balances[alice]} / {balances[bob]}")
+    correct = (
+        sum(withdrawals) == funded[spender] and balances[spender] == 0
+        and balances[alice] + balances[bob] == funded[alice] + funded[bob]
+        and min(balances.values()) >= 0
+        and balances == ledger_balances
+        and not problems
+    )
+    print("balances OK" if correct else f"BALANCE MISMATCH: wallets {balances}, ledger {ledger_balances}, {problems[:5]}")
+    return 0 if correct else 1
+
+
+if __name__ == "__main__":
+    import asyncio
+    sys.exit(asyncio.run(_bench()))
@@ -381,6 +381,101 @@ class DoerlyAPITester:
         
         return success_count >= 3
     
+    def test_task_pagination(self):
+        """Test keyset pagination on task list"""
+        print("\n=== Testing Task Pagination ===")
+        
+        if not self.user_token:
+            self.log_result("Task Pagination", False, "No user token available")
+            return False
+        
+        # Make sure there are at least two tasks to page through
+        for i in range(2):
+            task_data = {
+                "title": f"Pagination Task {i}",
+                "description": "Task created to test cursor pagination",
+                "task_type": "ai"
+            }
+            self.make_request("POST", "/tasks", task_data, params={"token": self.user_token})
+        
+        first = self.make_request("GET", "/tasks", params={"token": self.user_token, "limit": 1})
+        if not first or first.status_code != 200:
+            status = first.status_code if first else "No response"
+            self.log_result("Task Pagination", False, f"First page failed with status: {status}")
+            return False
+        
+        cursor = first.headers.get("X-Next-Cursor")
+        if len(first.json()) != 1 or not cursor:
+            self.log_result("Task Pagination", False, f"Expected 1 task and a next cursor, got: {first.json()}")
+            return False
+        
+        second = self.make_request("GET", "/tasks", params={"token": self.user_token, "limit": 1, "after": cursor})
+        if second and second.status_code == 200 and len(second.json()) == 1:
+            if second.json()[0]["id"] != first.json()[0]["id"]:
+                self.log_result("Task Pagination", True, "Second page continues after cursor")
+                return True
+            self.log_result("Task Pagination", False, "Second page repeated the first page")
+        else:
+            status = second.status_code if second else "No response"
+            self.log_result("Task Pagination", False, f"Second page failed with status: {status}")
+        return False
+
+    def test_query_budgets(self):
+        """Test per-request query accounting headers stay within budget"""
+        print("\n=== Testing Query Budgets ===")
+
+        if not self.user_token:
+            self.log_result("Query Budgets", False, "No user token available")
+            return False
+
+        # Mirrors repository.QUERY_BUDGETS for the read routes
+        budgets = {"/users/profile": 2, "/users/wallet": 1, "/notifications/unread-count": 1, "/tasks": 2}
+        for endpoint, max_queries in budgets.items():
+            response = self.make_request("GET", endpoint, params={"token": self.user_token})
+            if not response or response.status_code != 200:
+                status = response.status_code if response else "No response"
+                self.log_result("Query Budgets", False, f"{endpoint} failed with status: {status}")
+                return False
+            queries = response.headers.get("X-DB-Queries")
+            if queries is None:
+                self.log_result("Query Budgets", True, "Query accounting disabled on server, skipped")
+                return True
+            if int(queries) > max_queries:
+                self.log_result("Query Budgets", False, f"{endpoint} used {queries} queries, budget {max_queries}")
+                return False
+
+        self.log_result("Query Budgets", True, "Read routes within query budget")
+        return True
+
+    def test_conditional_get(self):
+        """Test ETag / If-None-Match on the task list"""
+        print("\n=== Testing Conditional GET ===")
+
+        if not self.user_token:
+            self.log_result("Conditional GET", False, "No user token available")
+            return False
+
+        url = f"{self.base_url}/tasks"
+        params = {"token": self.user_token}
+        first = requests.get(url, params=params, timeout=30)
+        etag = first.headers.get("ETag")
+        if first.status_code != 200 or not etag:
+            self.log_result("Conditional GET", False, f"Expected 200 with an ETag, got {first.status_code}")
+            return False
+
+        repeat = requests.get(url, params=params, headers={"If-None-Match": etag}, timeout=30)
+        if repeat.status_code != 304 or repeat.content:
+            self.log_result("Conditional GET", False, f"Repeat load returned {repeat.status_code}, expected empty 304")
+            return False
+
+        requests.post(url, params=params, json={"title": "ETag Task", "description": "Changes the list", "task_type": "ai"}, timeout=30)
+        changed = requests.get(url, params=params, headers={"If-None-Match": etag}, timeout=30)
+        if changed.status_code == 200 and changed.headers.get("ETag") != etag:
+            self.log_result("Conditional GET", True, "304 on repeat, fresh 200 after a write")
+            return True
+        self.log_result("Conditional GET", False, f"After a write got {changed.status_code}, expected 200 with a new ETag")
+        return False
+
     def test_automation_operations(self):
         """Test automation CRUD operations"""
         print("\n=== Testing Automation Operations ===")
@@ -562,6 +657,9 @@ class DoerlyAPITester:
             ("Payment Operations", self.test_payment_operations),
             ("Payment Transactions", self.test_payment_transactions),
             ("Task Operations", self.test_task_operations),
+            ("Task Pagination", self.test_task_pagination),
+            ("Query Budgets", self.test_query_budgets),
+            ("Conditional GET", self.test_conditional_get),
             ("Automation Operations", self.test_automation_operations),
             ("Notification Operations", self.test_notification_operations),
             ("Helper Operations", self.test_helper_operations),
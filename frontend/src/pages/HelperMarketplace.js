@@ -15,18 +15,23 @@ export default function HelperMarketplace() {
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedHelper, setSelectedHelper] = useState(null);
   const [showHireDialog, setShowHireDialog] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const token = localStorage.getItem('doerly_token');
 
   useEffect(() => {
-    fetchHelpers();
-  }, []);
+    // Debounce so typing sends one search, not one per keystroke
+    const timer = setTimeout(() => fetchHelpers(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
-  const fetchHelpers = async () => {
+  const fetchHelpers = async (after = null) => {
+    const q = searchTerm.trim();
     try {
-      const response = await api.get('/helpers', {
-        params: { token },
+      const response = await api.get('/helpers/search', {
+        params: { token, q: q.length >= 2 ? q : undefined, after: after || undefined },
       });
-      setHelpers(response.data);
+      setHelpers(after ? [...helpers, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to load helpers');
     } finally {
@@ -50,10 +55,6 @@ export default function HelperMarketplace() {
     }
   };
 
-  const filteredHelpers = helpers.filter(helper => 
-    helper.full_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    helper.email.toLowerCase().includes(searchTerm.toLowerCase())
-  );
 
   const getInitials = (name) => {
     const parts = name.split(' ');
@@ -86,7 +87,7 @@ export default function HelperMarketplace() {
             <Search className="absolute left-4 top-1/2 -translate-y-1/2 w-5 h-5 text-slate-400" />
             <Input
               type="text"
-              placeholder="Search helpers by name or email..."
+              placeholder="Search helpers by name or skill..."
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
               className="w-full bg-slate-950/50 border-white/10 text-white pl-12 h-12 rounded-xl"
@@ -125,7 +126,7 @@ export default function HelperMarketplace() {
             <div className="w-8 h-8 border-2 border-blue-500 border-t-transparent rounded-full animate-spin mx-auto mb-4" />
             <p>Loading helpers...</p>
           </div>
-        ) : filteredHelpers.length === 0 ? (
+        ) : helpers.length === 0 ? (
           <div className="glass-card text-center py-16">
             <Users className="w-20 h-20 text-blue-500 mx-auto mb-4 opacity-50" />
             <h3 className="font-heading text-2xl text-white mb-2">
@@ -142,7 +143,7 @@ export default function HelperMarketplace() {
           </div>
         ) : (
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-            {filteredHelpers.map((helper) => (
+            {helpers.map((helper) => (
               <div
                 key={helper.id}
                 data-testid={`helper-card-${helper.id}`}
@@ -240,6 +241,14 @@ export default function HelperMarketplace() {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-8">
+            <Button onClick={() => fetchHelpers(nextCursor)} className="btn-primary" data-testid="load-more-helpers">
+              Load more
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Hire Confirmation Dialog */}
@@ -8,7 +8,7 @@ import BottomNav from '@/components/BottomNav';
 
 export default function Insights() {
   const navigate = useNavigate();
-  const [tasks, setTasks] = useState([]);
+  const [summary, setSummary] = useState({ tasks: { total: 0, by_status: {} }, total_spent: 0 });
   const [wallet, setWallet] = useState({ balance: 0 });
   const [loading, setLoading] = useState(true);
   const token = localStorage.getItem('doerly_token');
@@ -19,11 +19,11 @@ export default function Insights() {
 
   const fetchData = async () => {
     try {
-      const [tasksRes, walletRes] = await Promise.all([
-        api.get('/tasks', { params: { token } }),
+      const [summaryRes, walletRes] = await Promise.all([
+        api.get('/insights/summary', { params: { token } }),
         api.get('/users/wallet', { params: { token } })
       ]);
-      setTasks(tasksRes.data);
+      setSummary(summaryRes.data);
       setWallet(walletRes.data);
     } catch (error) {
       toast.error('Failed to load insights');
@@ -32,10 +32,11 @@ export default function Insights() {
     }
   };
 
-  const completedTasks = tasks.filter(t => t.status === 'completed').length;
-  const pendingTasks = tasks.filter(t => t.status === 'pending').length;
-  const inProgressTasks = tasks.filter(t => t.status === 'in_progress').length;
-  const totalSpent = tasks.reduce((sum, t) => sum + (t.estimated_cost || 0), 0);
+  const totalTasks = summary.tasks.total;
+  const completedTasks = summary.tasks.by_status.completed || 0;
+  const pendingTasks = summary.tasks.by_status.pending || 0;
+  const inProgressTasks = summary.tasks.by_status.in_progress || 0;
+  const totalSpent = summary.total_spent;
 
   const stats = [
     { icon: CheckCircle, label: 'Completed Tasks', value: completedTasks, color: 'green' },
@@ -128,7 +129,7 @@ export default function Insights() {
                   <div className="w-full bg-slate-950/50 rounded-full h-3">
                     <div 
                       className="bg-gradient-to-r from-green-600 to-green-400 h-3 rounded-full transition-all"
-                      style={{ width: `${tasks.length > 0 ? (completedTasks / tasks.length) * 100 : 0}%` }}
+                      style={{ width: `${totalTasks > 0 ? (completedTasks / totalTasks) * 100 : 0}%` }}
                     />
                   </div>
                 </div>
@@ -140,7 +141,7 @@ export default function Insights() {
                   <div className="w-full bg-slate-950/50 rounded-full h-3">
                     <div 
                       className="bg-gradient-to-r from-blue-600 to-blue-400 h-3 rounded-full transition-all"
-                      style={{ width: `${tasks.length > 0 ? (inProgressTasks / tasks.length) * 100 : 0}%` }}
+                      style={{ width: `${totalTasks > 0 ? (inProgressTasks / totalTasks) * 100 : 0}%` }}
                     />
                   </div>
                 </div>
@@ -152,7 +153,7 @@ export default function Insights() {
                   <div className="w-full bg-slate-950/50 rounded-full h-3">
                     <div 
                       className="bg-gradient-to-r from-yellow-600 to-yellow-400 h-3 rounded-full transition-all"
-                      style={{ width: `${tasks.length > 0 ? (pendingTasks / tasks.length) * 100 : 0}%` }}
+                      style={{ width: `${totalTasks > 0 ? (pendingTasks / totalTasks) * 100 : 0}%` }}
                     />
                   </div>
                 </div>
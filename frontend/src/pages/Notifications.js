@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Button } from '@/components/ui/button';
-import { api } from '@/utils/api';
+import { api, subscribeToEvents } from '@/utils/api';
 import { ArrowLeft, Bell, Check, Trash2 } from 'lucide-react';
 import { toast } from 'sonner';
 import BottomNav from '@/components/BottomNav';
@@ -14,6 +14,9 @@ export default function Notifications() {
 
   useEffect(() => {
     fetchNotifications();
+    return subscribeToEvents({
+      notification: (notification) => setNotifications((current) => [notification, ...current]),
+    });
   }, []);
 
   const fetchNotifications = async () => {
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
-import { api } from '@/utils/api';
+import { api, subscribeToEvents } from '@/utils/api';
 import { ArrowLeft, Wallet as WalletIcon, Plus, ArrowUpRight, ArrowDownLeft, CreditCard, Send, Download } from 'lucide-react';
 import { toast } from 'sonner';
 import BottomNav from '@/components/BottomNav';
@@ -23,6 +23,9 @@ export default function Wallet() {
   useEffect(() => {
     fetchWallet();
     fetchTransactions();
+    return subscribeToEvents({
+      balance: ({ balance }) => setWallet((current) => ({ ...current, balance })),
+    });
   }, []);
 
   const fetchWallet = async () => {
@@ -19,3 +19,17 @@ export const setAuthToken = (token) => {
 export const clearAuthToken = () => {
   localStorage.removeItem('doerly_token');
 };
+
+// Push events for the signed-in user; handlers maps event name -> callback(data).
+// Returns a function that closes the stream.
+export const subscribeToEvents = (handlers) => {
+  const token = localStorage.getItem('doerly_token');
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  const source = new EventSource(`${API}/stream?token=${encodeURIComponent(token)}`);
+  Object.entries(handlers).forEach(([event, handler]) => {
+    source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+  });
+  return () => source.close();
+};
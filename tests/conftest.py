@@ -0,0 +1,135 @@
+"""Shared fixtures: backend modules on the path, and server.py bound to an in-memory database.
+
+The backend is a flat directory of modules (``import llm``, ``import wallet``),
+so it goes on ``sys.path`` the same way uvicorn runs it from ``backend/``.
+``server`` swaps its Motor database for ``mongomock_motor`` and rebinds every
+module-level object that captured it, so each test starts from an empty
+database and fresh caches.
+"""
+import asyncio
+import os
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+
+class FakeLlmChat:
+    """Stands in for emergentintegrations' LlmChat; tracks how many calls are upstream at once."""
+
+    active = 0
+    peak = 0
+    calls = 0
+    delay = 0.05
+    response = '{"title": "Fake task", "description": "", "task_type": "ai", "urgency": "medium"}'
+
+    def __init__(self, api_key=None, session_id=None, system_message=None):
+        self.api_key = api_key
+        self.session_id = session_id
+        self.system_message = system_message
+
+    def with_model(self, provider, model):
+        self.provider = provider
+        self.model = model
+        return self
+
+    async def send_message(self, message):
+        cls = type(self)
+        cls.calls += 1
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        try:
+            await asyncio.sleep(cls.delay)
+            return cls.response
+        finally:
+            cls.active -= 1
+
+    @classmethod
+    def reset(cls):
+        cls.active = cls.peak = cls.calls = 0
+
+
+def _provide_llm_module():
+    # The provider SDK comes from a private index; tests only ever talk to FakeLlmChat
+    try:
+        import emergentintegrations.llm.chat  # noqa: F401
+        return
+    except ImportError:
+        pass
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+
+    class UserMessage:
+        def __init__(self, text=None, file_contents=None):
+            self.text = text
+            self.file_contents = file_contents
+
+    class FileContentWithMimeType:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    class ImageContent:
+        def __init__(self, image_base64=None):
+            self.image_base64 = image_base64
+
+    chat.LlmChat = FakeLlmChat
+    chat.UserMessage = UserMessage
+    chat.FileContentWithMimeType = FileContentWithMimeType
+    chat.ImageContent = ImageContent
+    package = types.ModuleType("emergentintegrations")
+    llm_package = types.ModuleType("emergentintegrations.llm")
+    package.llm, llm_package.chat = llm_package, chat
+    sys.modules.update({
+        "emergentintegrations": package,
+        "emergentintegrations.llm": llm_package,
+        "emergentintegrations.llm.chat": chat,
+    })
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """server.py against a fresh mongomock database, with FakeLlmChat as the provider."""
+    _provide_llm_module()
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server as server_module
+    import cache
+    import llm
+    import wallet
+
+    db = AsyncMongoMockClient(tz_aware=True)["test"]  # like server.client
+    monkeypatch.setattr(server_module, "db", db)
+    for holder in ("ai_job_queue", "automation_scheduler", "notification_writer"):
+        monkeypatch.setattr(getattr(server_module, holder), "db", db)
+    monkeypatch.setattr(wallet, "_transactions_supported", False)  # mongomock has no sessions
+    monkeypatch.setattr(server_module, "LlmChat", FakeLlmChat)
+    monkeypatch.setattr(server_module, "llm_clients", llm.ClientPool(server_module._new_llm_client))
+    monkeypatch.setattr(server_module, "llm_cache", llm.ResultCache(server_module.LLM_CACHE_SIZE))
+    monkeypatch.setattr(server_module, "llm_gate", llm.ModelGate(server_module.LLM_MAX_CONCURRENCY, server_module.LLM_MAX_QUEUE))
+    monkeypatch.setattr(server_module, "llm_inflight", llm.InFlight())
+    monkeypatch.setattr(server_module, "llm_breakers", llm.CircuitBreaker(
+        server_module.LLM_BREAKER_FAILURES, server_module.LLM_BREAKER_RESET_SECONDS
+    ))
+    monkeypatch.setattr(server_module, "read_cache", cache.ReadThroughCache(server_module.CACHE_SIZE))
+    FakeLlmChat.reset()
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+    return TestClient(server.app)
+
+
+def register(client, email: str, **fields) -> dict:
+    response = client.post("/api/auth/register", json={
+        "email": email, "password": "pw", "full_name": email.split("@")[0], **fields
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {"id": body["user"]["id"], "headers": {"Authorization": f"Bearer {body['token']}"}}
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import ai_jobs
+
+
+def test_handler_timeout_must_be_shorter_than_the_lease():
+    with pytest.raises(ValueError):
+        ai_jobs.JobQueue(None, {}, lease_seconds=60, job_timeout=60)
+
+
+def test_waiting_on_a_job_finished_elsewhere_leaves_nothing_behind():
+    queue = ai_jobs.JobQueue(AsyncMongoMockClient()["jobs_test"], {}, lease_seconds=2, job_timeout=1)
+
+    async def poll():
+        await asyncio.gather(*(queue.wait_for_change("remote-job", 0.01) for _ in range(3)))
+
+    asyncio.run(poll())
+    assert queue.finished == {} and queue.watchers == {}
+
+
+def test_slow_handler_fails_before_its_lease_runs_out():
+    async def scenario():
+        async def slow(job):
+            await asyncio.sleep(5)
+
+        queue = ai_jobs.JobQueue(AsyncMongoMockClient()["jobs_test"], {"slow": slow}, lease_seconds=2, job_timeout=0.1)
+        job_id = await queue.submit("slow", "user", {})
+        await queue._run(await queue._claim())
+        job = await queue.get(job_id, "user")
+        assert (job["status"], job["error"]) == ("failed", "TimeoutError")
+        assert await queue.requeue_expired() == 0
+
+    asyncio.run(scenario())
+
+
+def test_busy_model_requeues_the_job_instead_of_failing_it(server):
+    async def scenario():
+        calls = []
+
+        async def busy_once(job):
+            calls.append(job["attempts"])
+            if len(calls) == 1:
+                raise server.HTTPException(status_code=429, detail="busy", headers={"Retry-After": "0"})
+            return {"ok": True}
+
+        queue = ai_jobs.JobQueue(
+            server.db, {"busy": busy_once}, lease_seconds=2, job_timeout=1, retry_delay=server._ai_retry_delay, max_backoff=0
+        )
+        job_id = await queue.submit("busy", "user", {}, b"payload")
+        await queue._run(await queue._claim())
+        job = await server.db.ai_jobs.find_one({"id": job_id})
+        assert (job["status"], job["payload"], queue.failed, queue.retried) == ("queued", b"payload", 0, 1)
+
+        await queue._run(await queue._claim())
+        job = await queue.get(job_id, "user")
+        assert (job["status"], job["result"], job["attempts"]) == ("done", {"ok": True}, 2)
+        assert calls == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_fail_once_attempts_run_out(server):
+    async def scenario():
+        async def unavailable(job):
+            raise server.HTTPException(status_code=503, detail="AI service unavailable")
+
+        queue = ai_jobs.JobQueue(
+            server.db, {"down": unavailable}, lease_seconds=2, job_timeout=1,
+            max_attempts=1, retry_delay=server._ai_retry_delay,
+        )
+        job_id = await queue.submit("down", "user", {})
+        await queue._run(await queue._claim())
+        assert (await queue.get(job_id, "user"))["status"] == "failed"
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+"""Batched task extraction: fewer model calls and lower latency than one call per text.
+
+Run with ``-s`` to see the comparison.
+"""
+import asyncio
+import json
+import re
+import time
+
+from fastapi import HTTPException
+
+from tests.conftest import FakeLlmChat
+
+TEXTS = 50
+DROPPED = "text 7"  # the model silently skips this input in its batch answer
+
+
+class BatchingChat(FakeLlmChat):
+    """Answers numbered batch prompts with a JSON array and single prompts with one object."""
+
+    async def send_message(self, message):
+        await super().send_message(message)
+        inputs = re.findall(r"^(\d+)\. (.*)$", message.text, re.MULTILINE)
+        if not inputs:
+            return '```json\n{"title": "Single", "description": "", "task_type": "ai", "urgency": "low"}\n```'
+        return json.dumps([
+            {"index": int(n), "title": f"Task for {text}", "description": "", "task_type": "helper", "urgency": "medium"}
+            for n, text in inputs if text != DROPPED
+        ])
+
+
+async def _timed(make_call):
+    started = time.perf_counter()
+    result = await make_call()
+    return result, time.perf_counter() - started
+
+
+def test_batching_saves_calls_and_latency_with_uniform_results(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", BatchingChat)
+    texts = [f"text {i}" for i in range(TEXTS)]
+
+    (results, batched_calls), batched_seconds = asyncio.run(_timed(lambda: server.run_batch_extraction(texts)))
+    BatchingChat.reset()
+
+    async def one_per_text():
+        # Paced at the gate's concurrency: 50 at once would overflow its queue with 429s
+        pace = asyncio.Semaphore(server.LLM_MAX_CONCURRENCY)
+
+        async def extract(text):
+            async with pace:
+                return await server.run_task_extraction(text, bypass_cache=True)
+        return await asyncio.gather(*(extract(text) for text in texts))
+
+    singles, single_seconds = asyncio.run(_timed(one_per_text))
+    single_calls = BatchingChat.calls
+    print(f"\nbatched: {batched_calls} calls in {batched_seconds * 1000:.0f} ms | "
+          f"one per text: {single_calls} calls in {single_seconds * 1000:.0f} ms")
+
+    # Two full batches plus one individual call for the dropped input
+    assert batched_calls == TEXTS // server.EXTRACT_BATCH_MAX_ITEMS + 1
+    assert single_calls == TEXTS and len(singles) == TEXTS
+    assert batched_seconds < single_seconds / 2
+    # Batched items and the fallback share one shape
+    assert all(isinstance(result["task_suggestion"], dict) for result in results)
+    assert results[7]["task_suggestion"]["title"] == "Single"
+    assert results[8]["task_suggestion"]["title"] == "Task for text 8"
+
+
+class ProseBatchChat(BatchingChat):
+    """Answers batch prompts with prose, single prompts as usual."""
+
+    async def send_message(self, message):
+        response = await super().send_message(message)
+        return "I could not follow the format." if response.startswith("[") else response
+
+
+def test_unparseable_batch_output_is_not_cached(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", ProseBatchChat)
+    texts = [f"text {i}" for i in range(3)]
+
+    async def twice():
+        first = await server.run_batch_extraction(texts)
+        ProseBatchChat.reset()
+        second = await server.run_batch_extraction(texts)
+        return first, second
+
+    (results, _), _ = asyncio.run(twice())
+    assert all(result["task_suggestion"]["title"] == "Single" for result in results)
+    # The singles were cached; the prose batch answer was not, so it went upstream again
+    assert ProseBatchChat.calls == 1
+
+
+class BusyBatchChat(BatchingChat):
+    """Fails the batch holding ``text 0``; the other batch drops every input."""
+
+    async def send_message(self, message):
+        if "1. text 0\n" in (message.text or ""):
+            raise HTTPException(status_code=429, detail="AI service is busy, please retry")
+        response = await super().send_message(message)
+        return "[]" if response.startswith("[") else response
+
+
+def test_failed_batch_fails_only_its_inputs_and_fallbacks_are_paced(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", BusyBatchChat)
+    BusyBatchChat.reset()
+    monkeypatch.setattr(server, "LLM_MAX_CONCURRENCY", 3)
+    texts = [f"text {i}" for i in range(2 * server.EXTRACT_BATCH_MAX_ITEMS)]
+
+    results, model_calls = asyncio.run(server.run_batch_extraction(texts, bypass_cache=True))
+
+    first, second = results[:server.EXTRACT_BATCH_MAX_ITEMS], results[server.EXTRACT_BATCH_MAX_ITEMS:]
+    assert all(result == {"error": "AI service is busy, please retry"} for result in first)
+    assert all(result["task_suggestion"]["title"] == "Single" for result in second)
+    assert model_calls == 2 + len(second)
+    assert BusyBatchChat.peak <= 3
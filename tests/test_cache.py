@@ -0,0 +1,55 @@
+import asyncio
+
+import cache
+
+
+def test_other_workers_converge_within_local_ttl_without_a_shared_tier():
+    writer, other = (cache.ReadThroughCache(local_ttl=0.05) for _ in range(2))
+    balance = {"value": 10.0}
+
+    async def load():
+        return dict(balance)
+
+    async def scenario():
+        key = cache.wallet_key("u1")
+        for worker in (writer, other):
+            assert await worker.get_or_load(key, 30, load) == {"value": 10.0}
+        balance["value"] = 4.0
+        await writer.invalidate(key)  # reaches the writer's process only
+        assert await writer.get_or_load(key, 30, load) == {"value": 4.0}
+        await asyncio.sleep(0.06)
+        return await other.get_or_load(key, 30, load)
+
+    assert asyncio.run(scenario()) == {"value": 4.0}
+
+
+def test_shared_only_reads_see_another_workers_invalidation_at_once():
+    async def scenario():
+        store = {}
+        redis = await asyncio.start_server(lambda r, w: cache._fake_redis(store, r, w), "127.0.0.1", 0)
+        url = f"redis://127.0.0.1:{redis.sockets[0].getsockname()[1]}/0"
+        writer, other = (cache.ReadThroughCache(shared=cache.RedisCache(url), local_ttl=30) for _ in range(2))
+        balance = {"value": 10.0}
+        loads = 0
+
+        async def load():
+            nonlocal loads
+            loads += 1
+            return dict(balance)
+
+        key = cache.wallet_key("u1")
+        try:
+            for worker in (writer, other):
+                assert await worker.get_or_load(key, 30, load, local=False) == {"value": 10.0}
+            assert loads == 1  # the other worker was served by the shared tier
+            balance["value"] = 4.0
+            await writer.invalidate(key)
+            return await other.get_or_load(key, 30, load, local=False)
+        finally:
+            await writer.close()
+            await other.close()
+            await asyncio.sleep(0.01)
+            redis.close()
+            await redis.wait_closed()
+
+    assert asyncio.run(scenario()) == {"value": 4.0}
@@ -0,0 +1,19 @@
+import asyncio
+
+import wallet
+from tests.conftest import register
+
+
+def test_every_route_serializes_dates_as_utc(server, client):
+    user = register(client, "dates@example.com")
+    assert asyncio.run(wallet.deposit(server.db, user["id"], 5.0, {"id": "fund", "amount": 5.0}))
+    client.post("/api/tasks", headers=user["headers"], json={"title": "T", "description": "", "task_type": "ai"})
+
+    profile = client.get("/api/users/profile", headers=user["headers"]).json()
+    login = client.post("/api/auth/login", json={"email": "dates@example.com", "password": "pw"}).json()
+    tasks = client.get("/api/tasks", headers=user["headers"]).json()
+    statement = client.get("/api/payments/statement", headers=user["headers"]).json()
+
+    stamps = [profile["created_at"], login["user"]["created_at"], tasks[0]["created_at"]]
+    stamps += [entry["created_at"] for entry in statement["entries"]]
+    assert stamps and all(stamp.endswith("+00:00") for stamp in stamps), stamps
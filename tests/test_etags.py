@@ -0,0 +1,25 @@
+import asyncio
+
+import cache
+import versions
+from tests.conftest import register
+
+
+def test_stale_worker_cache_is_never_served_under_a_new_etag(server, client):
+    user = register(client, "etag@example.com")
+    first = client.get("/api/users/profile", headers=user["headers"])
+    assert first.status_code == 200 and first.json()["full_name"] == "etag"
+
+    async def write_on_another_worker():
+        # That worker's invalidation reaches its own cache and the version counter, not this process
+        await server.db.users.update_one({"id": user["id"]}, {"$set": {"full_name": "renamed"}})
+        await versions.bump(server.db, cache.profile_key(user["id"]))
+
+    asyncio.run(write_on_another_worker())
+    second = client.get("/api/users/profile", headers={**user["headers"], "If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["full_name"] == "renamed"
+
+    third = client.get("/api/users/profile", headers={**user["headers"], "If-None-Match": second.headers["ETag"]})
+    assert third.status_code == 304
@@ -0,0 +1,79 @@
+"""Hedged LLM calls against a fake provider whose first call is slow."""
+import asyncio
+
+import llm
+from tests.conftest import FakeLlmChat
+
+
+class FirstCallSlowChat(FakeLlmChat):
+    delay = 0.01
+    slow = 0.5
+
+    async def send_message(self, message):
+        if type(self).calls == 0:
+            type(self).calls += 1
+            await asyncio.sleep(self.slow)
+            return "slow"
+        await super().send_message(message)
+        return "fast"
+
+
+def _chat_call(started: list):
+    async def call():
+        started.append(asyncio.current_task())
+        return await FirstCallSlowChat().send_message("hi")
+    return call
+
+
+def test_hedge_wins_and_the_slow_copy_is_cancelled():
+    FirstCallSlowChat.reset()
+    started = []
+
+    async def run():
+        result = await llm.hedged(_chat_call(started), 0.02)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == ("fast", True)
+    assert started[0].cancelled()
+
+
+def test_hedge_needs_a_spare_gate_slot():
+    async def run(max_concurrency: int):
+        FirstCallSlowChat.reset()
+        gate = llm.ModelGate(max_concurrency, 10)
+        async with gate.slot("m"):
+            return await llm.hedged(_chat_call([]), 0.02, lambda: gate.spare_slot("m"))
+
+    assert asyncio.run(run(2)) == ("fast", True)
+    assert asyncio.run(run(1)) == ("slow", False)  # saturated: wait for the first call instead
+
+
+def test_cancelled_caller_cancels_the_first_call():
+    FirstCallSlowChat.reset()
+    started = []
+
+    async def run():
+        caller = asyncio.ensure_future(llm.hedged(_chat_call(started), 0.2))
+        await asyncio.sleep(0.05)  # still inside the first wait
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert len(started) == 1 and started[0].cancelled()
+
+
+def test_hedging_never_exceeds_the_model_cap(server, monkeypatch):
+    monkeypatch.setattr(server, "LLM_HEDGE", True)
+    monkeypatch.setattr(server, "llm_gate", llm.ModelGate(2, 10))
+    monkeypatch.setattr(FakeLlmChat, "delay", 0.1)
+    for _ in range(20):
+        server.llm_latency.observe("gpt-5.1", 0.01)  # p95 of 10 ms: every call gets hedged if it can
+
+    async def burst():
+        return await asyncio.gather(*(server.run_task_extraction(f"text {i}", bypass_cache=True) for i in range(6)))
+
+    results = asyncio.run(burst())
+    assert all("task_suggestion" in result for result in results)
+    assert FakeLlmChat.peak == 2
@@ -0,0 +1,74 @@
+import asyncio
+import os
+
+import pytest
+
+import indexes
+from tests.conftest import register
+
+
+class _Cursor:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def sort(self, sort):
+        return self
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": self.stage}}}}
+
+
+class _PlanDb:
+    """Explains every query with the stage listed for its collection (IXSCAN otherwise)."""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def __getitem__(self, collection):
+        stage = self.stages.get(collection, "IXSCAN")
+        return type("Collection", (), {"find": lambda _, query, projection: _Cursor(stage)})()
+
+
+def test_collection_scan_fails_the_check():
+    db = _PlanDb({"tasks": "COLLSCAN"})
+    offenders = asyncio.run(indexes.find_collection_scans(db))
+    assert offenders and all("tasks" in offender for offender in offenders)
+    with pytest.raises(AssertionError, match="COLLSCAN"):
+        asyncio.run(indexes.assert_no_collection_scans(db))
+
+
+def test_indexed_plans_pass_the_check():
+    asyncio.run(indexes.assert_no_collection_scans(_PlanDb({})))
+
+
+def test_route_queries_use_indexes_on_mongodb():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def check():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            pytest.skip("MongoDB not reachable")
+        db = client["index_check"]
+        try:
+            await indexes.ensure_indexes(db)
+            await indexes.assert_no_collection_scans(db)
+        finally:
+            await client.drop_database("index_check")
+            client.close()
+
+    asyncio.run(check())
+
+
+def test_concurrent_duplicate_signup_is_a_400(server, client, monkeypatch):
+    asyncio.run(server.db.users.create_index("email", unique=True))
+    register(client, "dup@example.com")
+
+    async def not_seen(db, email):
+        return False  # both sign-ups passed the existence check
+
+    monkeypatch.setattr(server.repository, "email_exists", not_seen)
+    response = client.post("/api/auth/register", json={"email": "dup@example.com", "password": "pw", "full_name": "Dup"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already exists"
@@ -0,0 +1,96 @@
+import asyncio
+
+import ledger
+import wallet
+from tests.conftest import register
+
+
+def test_pre_ledger_wallets_are_opened_once(server):
+    db = server.db
+
+    async def scenario():
+        await db.users.insert_many([
+            {"id": "legacy", "email": "legacy@example.com", "wallet_balance": 42.5},
+            {"id": "empty", "email": "empty@example.com", "wallet_balance": 0.0},
+        ])
+        assert any(p["problem"] == "balance without ledger entries" for p in await ledger.verify(db))
+        assert await wallet.open_ledger_accounts(db) == 1
+        assert await wallet.open_ledger_accounts(db) == 0  # one-off
+        assert (await ledger.get_balance(db, "legacy"))[0] == 42.5
+        assert await ledger.external_balance(db, ledger.EXTERNAL_OPENING) == -42.5
+        assert await ledger.verify(db) == []
+
+    asyncio.run(scenario())
+
+
+def test_every_transaction_sums_to_zero(server):
+    db = server.db
+
+    async def scenario():
+        await db.users.insert_many([{"id": user, "wallet_balance": 0.0} for user in ("a", "b")])
+        row = lambda: {"id": str(len(rows)), "amount": 1.0, "status": "completed"}  # noqa: E731
+        rows = []
+        for call in (
+            lambda: wallet.deposit(db, "a", 10.0, rows[-1]),
+            lambda: wallet.transfer(db, "a", "b", 4.0, rows[-1]),
+            lambda: wallet.withdraw(db, "b", 3.0, rows[-1]),
+        ):
+            rows.append(row())
+            assert await call()
+        totals = {}
+        for collection in (db.ledger_entries, db.ledger_external):
+            async for entry in collection.find({}, {"_id": 0, "txn_id": 1, "amount": 1}):
+                totals[entry["txn_id"]] = totals.get(entry["txn_id"], 0.0) + entry["amount"]
+        assert len(totals) == 3 and set(totals.values()) == {0.0}
+        assert await ledger.external_balance(db, ledger.EXTERNAL_DEPOSITS) == -10.0
+        assert await ledger.external_balance(db, ledger.EXTERNAL_WITHDRAWALS) == 3.0
+        assert await ledger.verify(db) == []
+
+        await db.ledger_entries.insert_one({"account": "a", "seq": 99, "amount": 1.0, "txn_id": "one-legged"})
+        assert {"txn_id": "one-legged", "problem": "unbalanced transaction", "total": 1.0} in await ledger.verify(db)
+
+    asyncio.run(scenario())
+
+
+def test_deleted_account_is_closed_not_orphaned(server, client):
+    user = register(client, "leaving@example.com")
+    asyncio.run(server.db.users.update_one({"id": user["id"]}, {"$set": {"wallet_balance": 0.0}}))
+    assert asyncio.run(wallet.deposit(server.db, user["id"], 25.0, {"id": "fund", "amount": 25.0}))
+
+    assert client.delete("/api/users/account", headers=user["headers"]).status_code == 200
+
+    async def check():
+        assert (await ledger.get_balance(server.db, user["id"]))[0] == 0.0
+        assert await ledger.external_balance(server.db, ledger.EXTERNAL_CLOSURES) == 25.0
+        assert await ledger.verify(server.db) == []
+
+    asyncio.run(check())
+
+
+def test_concurrent_deposits_share_no_document(server, monkeypatch):
+    """Deposits by different users write disjoint documents, so their transactions cannot conflict."""
+    db = server.db
+    users = [f"user-{i}" for i in range(50)]
+    counters_written = []
+    append = ledger._append
+
+    async def spy(db, account, *args, **kwargs):
+        counters_written.append(account)
+        return await append(db, account, *args, **kwargs)
+
+    monkeypatch.setattr(ledger, "_append", spy)
+
+    async def scenario():
+        await db.users.insert_many([{"id": user, "wallet_balance": 0.0} for user in users])
+        results = await asyncio.gather(*(
+            wallet.deposit(db, user, 1.0, {"id": f"dep-{user}", "amount": 1.0}) for user in users
+        ))
+        assert all(results)
+        assert await db.ledger_external.count_documents({"account": ledger.EXTERNAL_DEPOSITS}) == len(users)
+        assert await db.ledger_accounts.count_documents({"account": {"$regex": "^external:"}}) == 0
+        assert await ledger.external_balance(db, ledger.EXTERNAL_DEPOSITS) == -len(users)
+        assert await ledger.verify(db) == []
+
+    asyncio.run(scenario())
+    # One counter document per wallet and none shared: nothing for with_transaction to retry on
+    assert sorted(counters_written) == sorted(users)
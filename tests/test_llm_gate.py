@@ -0,0 +1,37 @@
+"""A burst of AI requests against a small per-model gate: the cap holds and the overflow gets 429."""
+import asyncio
+from collections import Counter
+
+import httpx
+
+import llm
+from tests.conftest import FakeLlmChat, register
+
+CONCURRENCY = 3
+QUEUE = 5
+BURST = 20
+
+
+async def _burst(server, headers) -> list:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as http:
+        # Distinct texts so neither the result cache nor in-flight coalescing absorbs the burst
+        return await asyncio.gather(*(
+            http.post("/api/ai/extract-task", params={"text": f"burst request {i}"}) for i in range(BURST)
+        ))
+
+
+def test_burst_is_capped_and_overflow_rejected(server, client, monkeypatch):
+    user = register(client, "burst@example.com")
+    monkeypatch.setattr(server, "llm_gate", llm.ModelGate(CONCURRENCY, QUEUE, retry_after=7))
+    monkeypatch.setattr(FakeLlmChat, "delay", 0.2)
+
+    responses = asyncio.run(_burst(server, user["headers"]))
+
+    statuses = Counter(response.status_code for response in responses)
+    assert FakeLlmChat.peak == CONCURRENCY
+    assert statuses == {200: CONCURRENCY + QUEUE, 429: BURST - CONCURRENCY - QUEUE}
+    assert all(r.headers["Retry-After"] == "7" for r in responses if r.status_code == 429)
+    assert FakeLlmChat.calls == CONCURRENCY + QUEUE
+    stats = server.llm_gate.stats()
+    assert (stats["admitted"], stats["rejected"]) == (CONCURRENCY + QUEUE, BURST - CONCURRENCY - QUEUE)
@@ -0,0 +1,39 @@
+"""Pooled chat clients: reused across calls, but no session or history shared between callers."""
+import asyncio
+
+import llm
+from tests.conftest import FakeLlmChat
+
+
+class RecordingChat(FakeLlmChat):
+    delay = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history = []
+
+    async def send_message(self, message):
+        self.history.append(message)
+        return await super().send_message(message)
+
+
+def _factory(provider, model, system_message):
+    return RecordingChat(api_key="key", session_id="built", system_message=system_message)
+
+
+def test_each_checkout_gets_its_own_session_and_history():
+    pool = llm.ClientPool(_factory)
+
+    async def checkouts() -> list:
+        seen = []
+        for i in range(3):
+            async with pool.client("openai", "model", "system") as chat:
+                assert chat.history == []
+                seen.append((id(chat), chat.session_id))
+                await chat.send_message(f"user {i}")
+        return seen
+
+    seen = asyncio.run(checkouts())
+    assert len({client for client, _ in seen}) == 1  # one client reused...
+    assert len({session for _, session in seen}) == 3  # ...under a new session each time
+    assert (pool.created, pool.reused) == (1, 2)
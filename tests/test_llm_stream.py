@@ -0,0 +1,86 @@
+"""SSE model streams: breaker trials survive disconnects, deadlines never fire on a yield."""
+import asyncio
+import json
+import time
+
+from tests.conftest import FakeLlmChat
+
+MODEL = "gpt-5.1"
+
+
+class StreamingChat(FakeLlmChat):
+    pieces = ['{"title": ', '"Streamed"', "}"]
+
+    async def stream_message(self, message):
+        for piece in self.pieces:
+            await asyncio.sleep(0.001)
+            yield piece
+
+
+def _events(server, deadline: float = 30.0):
+    return server.stream_llm_events(
+        "openai", MODEL, "system", server.UserMessage(text="hi"), ("hi",), "task_suggestion", True, deadline
+    )
+
+
+def _half_open(server):
+    server.llm_breakers.opened_at[MODEL] = time.monotonic() - server.llm_breakers.reset_seconds - 1
+
+
+def test_disconnect_during_trial_releases_it(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", StreamingChat)
+    _half_open(server)
+
+    async def disconnect_mid_stream():
+        events = _events(server)
+        assert (await anext(events)).startswith("event: start")
+        assert (await anext(events)).startswith("event: delta")  # the trial is under way
+        assert server.llm_breakers.trial_running[MODEL]
+        await events.aclose()  # what Starlette does when the client goes away
+
+    asyncio.run(disconnect_mid_stream())
+    assert not server.llm_breakers.trial_running[MODEL]
+    assert server.llm_breakers.allow(MODEL)  # the next caller may probe
+
+
+def test_slow_consumer_does_not_count_against_the_deadline(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", StreamingChat)
+
+    async def consume_slowly():
+        received = []
+        async for event in _events(server, deadline=0.1):
+            received.append(event)
+            await asyncio.sleep(0.05)  # e.g. a slow client connection
+        return received
+
+    received = asyncio.run(consume_slowly())
+    assert received[-1].startswith("event: done")
+    assert json.loads(received[-1].split("data: ", 1)[1])["parsed"] == {"title": "Streamed"}
+    assert server.llm_breakers.state(MODEL) == "closed"
+
+
+def test_streaming_image_upload_is_size_checked(server, client):
+    response = client.post(
+        "/api/ai/analyze-image/stream",
+        content=b"",
+        headers={"Content-Length": str(server.MAX_UPLOAD_BYTES + server.UPLOAD_FORM_OVERHEAD + 1),
+                 "Content-Type": "multipart/form-data; boundary=x"},
+    )
+    assert response.status_code == 413
+
+
+class ProseChat(StreamingChat):
+    pieces = ["Sure! ", "Here is ", "your task."]
+
+
+def test_unparseable_stream_is_not_cached(server, monkeypatch):
+    monkeypatch.setattr(server, "LlmChat", ProseChat)
+
+    async def stream_then_lookup():
+        received = [event async for event in _events(server)]
+        key = server.llm.content_key("openai", MODEL, "system", "hi")
+        return received, await server.llm_cache.get(server.db, key, 0)
+
+    received, cached = asyncio.run(stream_then_lookup())
+    assert json.loads(received[-1].split("data: ", 1)[1])["valid"] is False
+    assert cached is None
@@ -0,0 +1,9 @@
+from tests.conftest import register
+
+
+def test_metrics_require_auth(client):
+    assert client.get("/api/metrics").status_code == 401
+    user = register(client, "ops@example.com")
+    response = client.get("/api/metrics", headers=user["headers"])
+    assert response.status_code == 200
+    assert "auth_cache" in response.json()
@@ -0,0 +1,29 @@
+import asyncio
+
+from tests.conftest import register
+
+
+def test_mark_read_is_owner_scoped_and_counts_once(server, client):
+    owner = register(client, "owner@example.com")
+    other = register(client, "other@example.com")
+
+    async def send():
+        await server.notify(owner["id"], "Task assigned")
+        await server.notification_writer.flush()
+        return (await server.db.notifications.find_one({"user_id": owner["id"]}))["id"]
+
+    notif_id = asyncio.run(send())
+    path = f"/api/notifications/{notif_id}/read"
+    unread = lambda: client.get("/api/notifications/unread-count", headers=owner["headers"]).json()["unread"]  # noqa: E731
+    assert unread() == 1
+
+    assert client.patch(path, headers=other["headers"]).status_code == 404
+    assert client.patch("/api/notifications/missing/read", headers=owner["headers"]).status_code == 404
+    assert unread() == 1
+
+    assert client.patch(path, headers=owner["headers"]).status_code == 200
+    first_read_at = asyncio.run(server.db.notifications.find_one({"id": notif_id}))["read_at"]
+    # Marking it again is still a 200, but neither the counter nor read_at move
+    assert client.patch(path, headers=owner["headers"]).status_code == 200
+    assert unread() == 0
+    assert asyncio.run(server.db.notifications.find_one({"id": notif_id}))["read_at"] == first_read_at
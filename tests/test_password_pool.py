@@ -0,0 +1,84 @@
+"""Login storm benchmark: unrelated requests keep their latency while bcrypt runs in the pool.
+
+Run with ``-s`` to see the latency table.
+"""
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ROUNDS = 10  # ~50-80 ms per hash: slow enough to show a stall, fast enough for CI
+LOGINS = 24
+EMAIL = "storm@example.com"
+
+
+def _p99(samples):
+    # A stalled loop may only get one probe through during the whole storm
+    return statistics.quantiles(samples, n=100)[98] if len(samples) > 1 else max(samples)
+
+
+async def _probe_latencies(http, stop: asyncio.Event) -> list:
+    samples = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await http.get("/api/")
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200
+        await asyncio.sleep(0.002)
+    return samples
+
+
+async def _storm(server) -> dict:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.post("/api/auth/register", json={"email": EMAIL, "password": "pw", "full_name": "Storm"})
+        assert response.status_code == 200, response.text
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe_latencies(http, stop))
+        await asyncio.sleep(0.2)
+        stop.set()
+        idle_samples = await probe
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe_latencies(http, stop))
+        started = time.perf_counter()
+        logins = await asyncio.gather(*(
+            http.post("/api/auth/login", json={"email": EMAIL, "password": "pw"}) for _ in range(LOGINS)
+        ))
+        storm_seconds = time.perf_counter() - started
+        stop.set()
+        storm_samples = await probe
+        assert all(login.status_code == 200 for login in logins)
+    return {"idle": idle_samples, "storm": storm_samples, "storm_seconds": storm_seconds}
+
+
+def _run(server, monkeypatch) -> dict:
+    monkeypatch.setattr(server, "BCRYPT_ROUNDS", ROUNDS)
+    monkeypatch.setattr(server, "password_slots", asyncio.Semaphore(server.PASSWORD_HASH_WORKERS + server.PASSWORD_HASH_MAX_PENDING))
+    return asyncio.run(_storm(server))
+
+
+def test_login_storm_does_not_stall_other_requests(server, monkeypatch):
+    pooled = _run(server, monkeypatch)
+
+    async def inline(func, *args):
+        return func(*args)  # the pre-pool behaviour: bcrypt on the event loop
+
+    with monkeypatch.context() as m:
+        m.setattr(server, "_run_password_job", inline)
+        asyncio.run(server.db.users.delete_many({}))
+        blocking = _run(server, m)
+
+    for name, result in (("thread pool", pooled), ("inline bcrypt", blocking)):
+        print(
+            f"\n{name:>13}: idle p99 {_p99(result['idle']) * 1000:6.1f} ms | "
+            f"storm p99 {_p99(result['storm']) * 1000:6.1f} ms over {len(result['storm'])} probes, "
+            f"{LOGINS} logins in {result['storm_seconds']:.2f}s"
+        )
+
+    # Flat: a login storm adds no more than a few tens of ms to an unrelated request's p99...
+    assert _p99(pooled["storm"]) < _p99(pooled["idle"]) + 0.05
+    # ...while inline hashing stalls it for at least one whole hash
+    assert _p99(blocking["storm"]) > 2 * _p99(pooled["storm"])
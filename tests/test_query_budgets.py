@@ -0,0 +1,125 @@
+"""Hot routes stay within ``repository.QUERY_BUDGETS``, measured through the real middleware.
+
+mongomock never reaches pymongo's command monitoring, so ``CountedDatabase``
+reports each collection call to the query accounting listener the way a
+``CommandSucceededEvent`` would: one round trip per call (a cursor counts when
+it is drained), with the documents it returned as the reply.
+"""
+import asyncio
+
+import pytest
+
+import repository
+from tests.conftest import register
+
+CURSOR_METHODS = {"sort", "skip", "limit", "hint", "batch_size", "allow_disk_use"}
+
+
+class _Reply:
+    def __init__(self, documents):
+        self.reply = {"cursor": {"firstBatch": documents}, "ok": 1}
+
+
+def _documents(result) -> list:
+    if isinstance(result, dict):
+        return [result]
+    if isinstance(result, list):
+        return result
+    if isinstance(result, int):
+        return [{"n": result}]
+    return []
+
+
+class CountedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in CURSOR_METHODS:
+            return lambda *args, **kwargs: CountedCursor(attr(*args, **kwargs))
+        return attr
+
+    async def to_list(self, length=None):
+        documents = await self._cursor.to_list(length)
+        repository.query_accounting.succeeded(_Reply(documents))
+        return documents
+
+    async def __aiter__(self):
+        for document in await self.to_list(None):
+            yield document
+
+
+class CountedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in ("find", "aggregate"):
+            return lambda *args, **kwargs: CountedCursor(attr(*args, **kwargs))
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            result = await attr(*args, **kwargs)
+            repository.query_accounting.succeeded(_Reply(_documents(result)))
+            return result
+        return call
+
+
+class CountedDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return CountedCollection(self._db[name])
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        return CountedCollection(attr) if hasattr(attr, "find_one") else attr
+
+
+@pytest.fixture
+def counted(server, client, monkeypatch):
+    accounting = repository.QueryAccounting()
+    accounting.enabled = True
+    monkeypatch.setattr(repository, "query_accounting", accounting)
+    monkeypatch.setattr(server, "db", CountedDatabase(server.db))
+    return accounting
+
+
+def _within_budget(response, route: str):
+    assert response.status_code == 200, response.text
+    # Accounting is on, so a missing header is a failure, not a skip
+    round_trips, reply_bytes = int(response.headers["X-DB-Queries"]), int(response.headers["X-DB-Bytes"])
+    max_round_trips, max_bytes = repository.QUERY_BUDGETS[route]
+    assert round_trips <= max_round_trips, f"{route}: {round_trips} round trips, budget {max_round_trips}"
+    assert reply_bytes <= max_bytes, f"{route}: {reply_bytes} bytes, budget {max_bytes}"
+
+
+def test_budgeted_routes_stay_within_budget(server, client, counted):
+    sender = register(client, "sender@example.com")
+    recipient = register(client, "recipient@example.com")
+    asyncio.run(server.db._db.users.update_one({"id": sender["id"]}, {"$set": {"wallet_balance": 100.0}}))
+    task = client.post("/api/tasks", json={"title": "Budgeted", "description": "", "task_type": "ai"}, headers=sender["headers"])
+    assert task.status_code == 200, task.text
+
+    requests = [
+        ("POST /api/auth/login", lambda: client.post("/api/auth/login", json={"email": "sender@example.com", "password": "pw"})),
+        ("POST /api/payments/send", lambda: client.post(
+            "/api/payments/send", json={"recipient_email": "recipient@example.com", "amount": 5.0}, headers=sender["headers"]
+        )),
+    ]
+    for path in ("/api/users/profile", "/api/users/wallet", "/api/users/stats", "/api/tasks",
+                 f"/api/tasks/{task.json()['id']}", "/api/notifications/unread-count"):
+        route = "GET " + ("/api/tasks/{task_id}" if path.startswith("/api/tasks/") else path)
+        # Twice: the first request fills the caches, the second must not cost more
+        requests += [(route, lambda path=path: client.get(path, headers=sender["headers"]))] * 2
+
+    for route, send in requests:
+        _within_budget(send(), route)
+
+    assert set(repository.QUERY_BUDGETS) <= set(counted.routes)  # every budget was exercised under its own key
+    assert all(counted.routes[route]["over_budget"] == 0 for route in repository.QUERY_BUDGETS)
+    assert client.get("/api/users/wallet", headers=recipient["headers"]).json()["balance"] == 5.0
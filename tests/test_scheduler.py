@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import scheduler
+
+
+async def _due(db, *ids):
+    due = (datetime.now(timezone.utc) - timedelta(minutes=1)).replace(microsecond=0)
+    await db.automations.insert_many([
+        {"id": auto_id, "active": True, "schedule": "hourly", "next_run_at": due} for auto_id in ids
+    ])
+    return due
+
+
+def test_margin_must_leave_room_in_the_lease():
+    with pytest.raises(ValueError):
+        scheduler.Scheduler(None, None, lease_seconds=10, lease_margin=10)
+
+
+def test_slot_wait_and_run_stay_inside_the_lease():
+    db = AsyncMongoMockClient()["scheduler_test"]
+    finished = []
+
+    async def run(auto):
+        await asyncio.sleep(0.6)  # longer than the 0.5 s the lease leaves
+        finished.append(auto['id'])
+
+    async def scenario():
+        due = await _due(db, "first", "second")
+        jobs = scheduler.Scheduler(db, run, concurrency=1, lease_seconds=1, lease_margin=0.5)
+        started = asyncio.get_running_loop().time()
+        await jobs.tick()
+        elapsed = asyncio.get_running_loop().time() - started
+        docs = {doc['id']: doc async for doc in db.automations.find({}, {"_id": 0})}
+        return jobs, due, elapsed, docs
+
+    jobs, due, elapsed, docs = asyncio.run(scenario())
+    assert elapsed < 0.75  # both runs were bounded by the claim's lease, not 2 x 0.6 s
+    assert finished == [] and (jobs.fired, jobs.failed) == (0, 1)
+    # The run that never got a slot is handed back, still due, and unclaimed
+    waited = next(doc for doc in docs.values() if "last_run" not in doc)
+    assert scheduler._aware(waited['next_run_at']) == due and "claim" not in waited
@@ -0,0 +1,22 @@
+import asyncio
+
+import stats
+import wallet
+from tests.conftest import register
+
+
+def test_deleting_a_sender_takes_their_payments_out_of_received(server, client):
+    sender, recipient = register(client, "sender@example.com"), register(client, "recipient@example.com")
+    assert asyncio.run(wallet.deposit(server.db, sender["id"], 20.0, {"id": "fund", "amount": 20.0}))
+    for _ in range(2):
+        response = client.post(
+            "/api/payments/send", headers=sender["headers"], json={"recipient_email": "recipient@example.com", "amount": 5.0}
+        )
+        assert response.status_code == 200
+    assert client.get("/api/users/stats", headers=recipient["headers"]).json()["received"] == 10.0
+
+    assert client.delete("/api/users/account", headers=sender["headers"]).status_code == 200
+
+    assert client.get("/api/users/stats", headers=recipient["headers"]).json().get("received", 0) == 0
+    report = asyncio.run(stats.reconcile_user_stats(server.db))
+    assert report["users_drifted"] == 0, report
@@ -0,0 +1,43 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+
+from starlette.datastructures import UploadFile
+
+from tests.conftest import register
+
+
+def test_chunked_base64_matches_one_shot_encoding(server):
+    raw = os.urandom(server.UPLOAD_CHUNK_BYTES * 2 + 7)
+    assert server.base64_from_file(io.BytesIO(raw)) == base64.b64encode(raw).decode("ascii")
+
+
+def test_upload_is_hashed_in_place_and_rewound(server, monkeypatch):
+    monkeypatch.setattr(server.MultiPartParser, "max_file_size", 1024)
+    monkeypatch.setattr(server, "upload_stats", dict.fromkeys(server.upload_stats, 0))
+
+    async def upload(size: int):
+        file = UploadFile(io.BytesIO(b"x" * size))
+        digest = await server.scan_upload(file)
+        assert digest == hashlib.sha256(b"x" * size).hexdigest()
+        assert await file.read() == b"x" * size  # the route reads the same file, not a copy
+
+    asyncio.run(upload(1024))
+    asyncio.run(upload(1025))
+    assert server.upload_stats["accepted"] == 2
+    assert server.upload_stats["spooled_to_disk"] == 1
+
+
+def test_oversized_upload_is_a_413(server, client, monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 1000)
+    user = register(client, "upload@example.com")
+    response = client.post(
+        "/api/ai/analyze-document", headers=user["headers"], files={"file": ("a.txt", b"x" * 1001, "text/plain")}
+    )
+    assert response.status_code == 413
+    response = client.post(
+        "/api/ai/analyze-document", headers=user["headers"], files={"file": ("a.txt", b"hello", "text/plain")}
+    )
+    assert response.json() == {"extracted_text": "hello"}
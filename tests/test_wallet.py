@@ -0,0 +1,36 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import wallet
+
+
+def test_concurrent_withdrawals_and_transfers_keep_balances(monkeypatch, capsys):
+    monkeypatch.setattr(wallet, "_transactions_supported", False)  # mongomock has no sessions
+    db = AsyncMongoMockClient()["wallet_test"]
+    assert asyncio.run(wallet._hammer(db, concurrency=50, operations=400)) == 0
+    assert "balances OK" in capsys.readouterr().out
+
+
+def test_transfer_to_a_deleted_recipient_is_a_404_and_moves_nothing(server, client, monkeypatch):
+    from tests.conftest import register
+
+    sender = register(client, "sender@example.com")
+    register(client, "gone@example.com")
+    assert asyncio.run(wallet.deposit(server.db, sender["id"], 20.0, {"id": "fund", "amount": 20.0}))
+
+    async def deleted_after_lookup(db, email):
+        return "deleted-user-id"  # found by email, gone by the time the credit runs
+
+    monkeypatch.setattr(server.repository, "find_user_id_by_email", deleted_after_lookup)
+    response = client.post(
+        "/api/payments/send", headers=sender["headers"], json={"recipient_email": "gone@example.com", "amount": 5.0}
+    )
+    assert response.status_code == 404
+
+    async def check():
+        user = await server.db.users.find_one({"id": sender["id"]})
+        assert user["wallet_balance"] == 20.0
+        assert await server.db.transactions.count_documents({"task_id": "send_money"}) == 0
+
+    asyncio.run(check())